@@ -1,4 +1,4 @@
-
+import os
 from pathlib import Path
 
 
@@ -55,10 +55,49 @@ WSGI_APPLICATION = 'caicai.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('CAICAI_DB_PATH') or BASE_DIR / 'db.sqlite3',
+    }
+}
+
+# Perfil de base de datos: 'dev' (por defecto) o 'production' (gunicorn con varios workers).
+# En producción: WAL (lectores no bloquean al escritor), BEGIN IMMEDIATE (el lock de escritura
+# se pide al inicio de la transacción y espera busy_timeout en vez de fallar al promover),
+# conexiones persistentes con health check.
+DB_PROFILE = os.environ.get('CAICAI_DB_PROFILE', 'dev')
+
+SQLITE_BUSY_TIMEOUT = 20  # segundos
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}',
+    'PRAGMA mmap_size=134217728',  # 128 MB
+    'PRAGMA cache_size=-20000',    # ~20 MB por conexión
+    'PRAGMA temp_store=MEMORY',
+]
+
+# Caché: en desarrollo memoria local; en producción un directorio compartido por todos los
+# workers de gunicorn (p. ej. el índice de stock bajo).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+if DB_PROFILE == 'production':
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CAICAI_CACHE_DIR') or os.path.join(BASE_DIR, '.cache'),
+    }
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+    })
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -91,10 +130,16 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-import os
-
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Django sirve /media/ en desarrollo o si CAICAI_SERVE_MEDIA=1 (sin proxy delante)
+SERVE_MEDIA = DEBUG or os.environ.get('CAICAI_SERVE_MEDIA') == '1'
+# Archivo de boletas en PDF (cierre de mes); fuera de MEDIA_ROOT para que no sea público
+BOLETAS_ROOT = os.environ.get('CAICAI_BOLETAS_DIR') or os.path.join(BASE_DIR, 'boletas')
+
+# Tareas largas del panel (core.tareas): se lanzan en un hilo del worker que las encola.
+# Con CAICAI_TAREAS_EN_HILO=0 quedan pendientes para `manage.py procesar_tareas` (cron/systemd).
+TAREAS_EN_HILO = os.environ.get('CAICAI_TAREAS_EN_HILO', '1') == '1'
 
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
@@ -106,3 +151,6 @@ AUTH_USER_MODEL = 'core.Cliente'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/catalogo/'
 LOGOUT_REDIRECT_URL = '/catalogo/'
+
+STOCK_HOLD_TTL = 600  # segundos que se aparta el stock al iniciar el checkout
+IDEMPOTENCY_KEY_TTL = 86400  # segundos que se conserva cada clave de confirmación de pedido
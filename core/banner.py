@@ -0,0 +1,87 @@
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BannerImagen, Producto
+
+
+BANNER_FOLDERS = ('productos', 'fotos')  # prioridad: media/productos, luego media/fotos
+BANNER_TARGET = 8
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+MANIFEST_KEY = 'banner:manifest'
+
+
+def _media_url(ruta: str) -> str:
+    return f"{settings.MEDIA_URL.rstrip('/')}/{ruta}"
+
+
+def _mtimes() -> dict:
+    """
+    mtime de cada carpeta del banner: cambia al agregar, quitar o renombrar archivos.
+    """
+    mtimes = {}
+    for folder in BANNER_FOLDERS:
+        try:
+            mtimes[folder] = os.stat(os.path.join(settings.MEDIA_ROOT, folder)).st_mtime_ns
+        except OSError:
+            mtimes[folder] = None
+    return mtimes
+
+
+def escanear_imagenes(limit: int | None = None) -> list:
+    """
+    Rutas (relativas a MEDIA_ROOT) de las imágenes de las carpetas del banner, en orden.
+    """
+    rutas = []
+    for folder in BANNER_FOLDERS:
+        base = os.path.join(settings.MEDIA_ROOT, folder)
+        if not os.path.isdir(base):
+            continue
+        for fname in sorted(os.listdir(base)):
+            if fname.lower().endswith(IMAGE_EXTENSIONS):
+                rutas.append(f'{folder}/{fname}')
+                if limit and len(rutas) >= limit:
+                    return rutas
+    return rutas
+
+
+def _construir_manifiesto() -> dict:
+    fijadas = list(BannerImagen.objects.values_list('ruta', flat=True))
+    if fijadas:
+        return {'fijadas': True, 'mtimes': None, 'imagenes': [_media_url(r) for r in fijadas]}
+
+    mtimes = _mtimes()
+    imagenes = [_media_url(r) for r in escanear_imagenes(BANNER_TARGET)]
+    if len(imagenes) < BANNER_TARGET:
+        con_imagen = Producto.objects.filter(activo=True).exclude(imagen='').exclude(imagen__isnull=True)
+        for p in con_imagen.only('id', 'imagen')[:BANNER_TARGET - len(imagenes)]:
+            imagenes.append(p.imagen.url)
+    return {'fijadas': False, 'mtimes': mtimes, 'imagenes': imagenes}
+
+
+def imagenes_banner() -> list:
+    """
+    URLs del banner del catálogo desde el manifiesto en caché (compartido entre workers).
+    Con imágenes fijadas no se toca el disco; si no, solo se comparan los mtime de las carpetas.
+    """
+    manifiesto = cache.get(MANIFEST_KEY)
+    if manifiesto is None or (not manifiesto['fijadas'] and manifiesto['mtimes'] != _mtimes()):
+        manifiesto = _construir_manifiesto()
+        cache.set(MANIFEST_KEY, manifiesto, None)
+    return list(manifiesto['imagenes'])
+
+
+def invalidar_banner() -> None:
+    transaction.on_commit(lambda: cache.delete(MANIFEST_KEY))
+
+
+def fijar_imagenes(rutas: list) -> None:
+    """
+    Reemplaza las imágenes fijadas por `rutas` (en ese orden). Lista vacía vuelve al escaneo.
+    """
+    with transaction.atomic():
+        BannerImagen.objects.all().delete()
+        BannerImagen.objects.bulk_create([BannerImagen(ruta=r, orden=i) for i, r in enumerate(rutas)])
+        invalidar_banner()
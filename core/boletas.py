@@ -0,0 +1,224 @@
+import hashlib
+import io
+import os
+import shutil
+import zipfile
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DetallePedido, Pedido, SolicitudConfeccion, Tarea
+from .pdf import VERSION_RENDERER, escribir_documento
+from .tareas import avanzar
+
+
+BOLETA_TIPOS = ('pedido', 'confeccion')
+BOLETA_CACHE_TTL = 7 * 24 * 3600  # el PDF depende solo de los datos y del renderer: la clave cambia si cambian
+LECTURA_CHUNK = 500  # objetos por consulta al leer el contenido de boletas en bloque
+ZIP_CARPETAS = {'pedido': 'pedidos', 'confeccion': 'confecciones'}
+
+
+def boleta_url(tipo: str, obj_id: int) -> str:
+    return reverse('boleta', args=[tipo, obj_id])
+
+
+def pedido_tiene_boleta(pedido) -> bool:
+    return pedido.estado == 'finalizado'
+
+
+def confeccion_tiene_boleta(solicitud) -> bool:
+    return solicitud.cotizacion_aceptada is True
+
+
+def con_boleta(tipo: str, qs=None):
+    """
+    Restringe `qs` (por defecto todos los objetos del tipo) a los que tienen boleta.
+    """
+    if tipo == 'pedido':
+        return (qs if qs is not None else Pedido.objects.all()).filter(estado='finalizado')
+    return (qs if qs is not None else SolicitudConfeccion.objects.all()).filter(cotizacion_aceptada=True)
+
+
+def items_pedido(qs):
+    """
+    Detalle de boleta como tuplas (pedido_id, cantidad, nombre del producto, subtotal): sin
+    instanciar modelos, que es lo que domina el costo al armar miles de boletas.
+    """
+    return qs.order_by('pedido_id', 'id').values_list('pedido_id', 'cantidad', 'producto__nombre', 'subtotal')
+
+
+def contenido_pedido(pedido, items=None):
+    """
+    Título y líneas de la boleta. `items` (ver items_pedido) agrega el detalle ítem por ítem;
+    el documento se pagina solo si no cabe en una hoja.
+    """
+    lines = [
+        f"Cliente: {pedido.nombre_cliente}",
+        f"Correo: {pedido.correo}",
+        f"Dirección: {pedido.direccion}",
+        f"Fecha: {pedido.fecha:%d/%m/%Y %H:%M}",
+        f"Estado: {pedido.estado}",
+    ]
+    if items:
+        lines.append("")
+        lines.append("Detalle:")
+        for _, cantidad, nombre, subtotal in items:
+            lines.append(f"{cantidad} x {nombre} — {subtotal}")
+        lines.append("")
+    lines.append(f"Total: {pedido.total}")
+    return f"Boleta Pedido #{pedido.id}", lines
+
+
+def contenido_confeccion(solicitud):
+    lines = [
+        f"Cliente: {solicitud.nombre}",
+        f"Correo: {solicitud.correo}",
+        f"Teléfono: {solicitud.telefono}",
+        f"Fecha: {solicitud.fecha_creacion:%d/%m/%Y %H:%M}",
+        f"Prenda: {solicitud.get_tipo_prenda_display()}",
+        f"Estado: {solicitud.get_estado_display()}",
+    ]
+    if solicitud.cotizacion_monto:
+        lines.append(f"Cotización: {solicitud.cotizacion_monto}")
+    return f"Boleta Confección #{solicitud.id}", lines
+
+
+def render_boleta_pdf(title: str, lines: list[str]) -> bytes:
+    buffer = io.BytesIO()
+    escribir_documento(buffer, title, lines)
+    return buffer.getvalue()
+
+
+def etag_boleta(title: str, lines: list[str]) -> str:
+    """
+    ETag derivado del contenido y de VERSION_RENDERER: se puede responder 304 sin generar el PDF,
+    y un cambio en el renderer no deja a navegadores ni caché con el PDF anterior.
+    """
+    return hashlib.sha256('\n'.join([f'v{VERSION_RENDERER}', title, *lines]).encode()).hexdigest()[:32]
+
+
+def obtener_boleta(title: str, lines: list[str]) -> dict:
+    """
+    Devuelve {'pdf', 'etag', 'generado'} desde la caché; si no está, genera el PDF en memoria
+    una sola vez y lo guarda (sin escribir en MEDIA_ROOT).
+    """
+    etag = etag_boleta(title, lines)
+    key = f'boleta:{etag}'
+    boleta = cache.get(key)
+    if boleta is None:
+        boleta = {'pdf': render_boleta_pdf(title, lines), 'etag': etag, 'generado': timezone.now()}
+        cache.set(key, boleta, BOLETA_CACHE_TTL)
+    return boleta
+
+
+def ruta_archivo(tipo: str, obj_id: int) -> str:
+    return os.path.join(settings.BOLETAS_ROOT, f'{tipo}_{obj_id}.pdf')
+
+
+def archivar_boleta(path: str, title: str, lines: list[str]) -> int:
+    """
+    Escribe la boleta en `path` de forma atómica (archivo temporal + rename): un lector nunca ve
+    un PDF a medias y una ejecución interrumpida no deja archivos corruptos. Devuelve los bytes escritos.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        escribir_documento(fh, title, lines)
+        escritos = fh.tell()
+    os.replace(tmp, path)
+    return escritos
+
+
+def leer_contenidos(tipo: str, ids: list):
+    """
+    Genera (obj, title, lines) para `ids`, en el orden dado, con una o dos consultas por cada
+    LECTURA_CHUNK objetos (los pedidos traen su detalle en una sola lectura por bloque).
+    """
+    modelo = Pedido if tipo == 'pedido' else SolicitudConfeccion
+    for start in range(0, len(ids), LECTURA_CHUNK):
+        bloque = ids[start:start + LECTURA_CHUNK]
+        objetos = modelo.objects.in_bulk(bloque)
+        items = defaultdict(list)
+        if tipo == 'pedido':
+            for item in items_pedido(DetallePedido.objects.filter(pedido_id__in=bloque)):
+                items[item[0]].append(item)
+        for pk in bloque:
+            obj = objetos.get(pk)
+            if obj is None:
+                continue
+            if tipo == 'pedido':
+                title, lines = contenido_pedido(obj, items[pk])
+            else:
+                title, lines = contenido_confeccion(obj)
+            yield obj, title, lines
+
+
+def tarea_archivar_boletas(tarea) -> None:
+    """
+    Tarea 'archivar_boletas': escribe en BOLETAS_ROOT las boletas de los pedidos
+    `parametros['pedido_ids']` que aún no están (reanudable, como generar_boletas).
+    """
+    os.makedirs(settings.BOLETAS_ROOT, exist_ok=True)
+    # al reanudar se recorre la lista completa (las ya escritas se saltan): el avance parte de cero
+    Tarea.objects.filter(pk=tarea.pk).update(procesados=0)
+    ids = list(
+        con_boleta('pedido', Pedido.objects.filter(id__in=tarea.parametros['pedido_ids']))
+        .order_by('id').values_list('id', flat=True)
+    )
+    hechos = 0
+    for obj, title, lines in leer_contenidos('pedido', ids):
+        path = ruta_archivo('pedido', obj.id)
+        if not os.path.exists(path):
+            archivar_boleta(path, title, lines)
+        hechos += 1
+        if hechos % LECTURA_CHUNK == 0:
+            avanzar(tarea, LECTURA_CHUNK)
+    avanzar(tarea, hechos % LECTURA_CHUNK)
+
+
+class _SalidaZip(io.RawIOBase):
+    """
+    Destino sin seek para ZipFile: acumula lo escrito hasta que el generador lo entrega.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.partes.append(bytes(data))
+        return len(data)
+
+    def vaciar(self) -> bytes:
+        data = b''.join(self.partes)
+        self.partes.clear()
+        return data
+
+
+def zip_boletas(ids_por_tipo: dict):
+    """
+    Genera un zip con las boletas de {tipo: [ids]} de a un archivo por vez: en memoria solo
+    queda la boleta en curso. Usa la copia de BOLETAS_ROOT si existe y si no la genera al vuelo.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for tipo, ids in ids_por_tipo.items():
+            for obj, title, lines in leer_contenidos(tipo, ids):
+                nombre = f'{tipo}_{obj.id}.pdf'
+                fecha = obj.fecha if tipo == 'pedido' else obj.fecha_creacion
+                info = zipfile.ZipInfo(f'{ZIP_CARPETAS[tipo]}/{nombre}', timezone.localtime(fecha).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archivada = os.path.join(settings.BOLETAS_ROOT, nombre)
+                with zf.open(info, 'w') as destino:
+                    if os.path.exists(archivada):
+                        with open(archivada, 'rb') as origen:
+                            shutil.copyfileobj(origen, destino)
+                    else:
+                        escribir_documento(destino, title, lines)
+                yield salida.vaciar()
+    yield salida.vaciar()
@@ -0,0 +1,317 @@
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, PositiveIntegerField, Value, When
+
+from .models import ClaveIdempotencia, Producto, Pedido, DetallePedido
+from .low_stock import invalidar_low_stock
+from .reservas import liberar_reservas, reservado_agregado, reservado_subquery
+from .thumbnails import thumb_url
+
+
+MAX_PRODUCT_QUANTITY = 200  # límite duro por producto en el carrito
+MAX_ORDER_TOTAL = Decimal('999999999999.99')  # límite seguro según max_digits=14, decimal_places=2
+
+
+# máximo de líneas por UPDATE condicional (evita expresiones SQL demasiado profundas)
+STOCK_UPDATE_CHUNK = 200
+
+
+class StockInsuficiente(Exception):
+    """
+    El carrito no puede convertirse en pedido. `faltantes` es una lista de (nombre, disponible, solicitado).
+    """
+
+    def __init__(self, faltantes):
+        super().__init__('stock insuficiente')
+        self.faltantes = faltantes
+
+
+class TotalExcedido(Exception):
+    pass
+
+
+class PedidoDuplicado(Exception):
+    """
+    El token ya fue usado por otro envío (concurrente) que sí creó el pedido.
+    """
+
+    def __init__(self, pedido):
+        super().__init__('pedido duplicado')
+        self.pedido = pedido
+
+
+def emitir_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def ttl_idempotencia() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+
+
+def pedido_por_token(cliente, token: str):
+    """
+    Devuelve el pedido ya creado con este token (o None). Una búsqueda por índice único.
+    """
+    if not token:
+        return None
+    registro = (
+        ClaveIdempotencia.objects
+        .select_related('pedido')
+        .filter(token=token, cliente_id=cliente.pk)
+        .first()
+    )
+    return registro.pedido if registro else None
+
+
+def normalizar_carrito(request) -> dict:
+    """
+    Ajusta las cantidades del carrito en sesión al rango [1, MAX_PRODUCT_QUANTITY].
+    Devuelve el carrito (ya persistido en sesión si hubo cambios).
+    """
+    carrito = request.session.get('carrito', {})
+    changed = False
+    for pid, cantidad in list(carrito.items()):
+        try:
+            qty = int(cantidad)
+        except (TypeError, ValueError):
+            qty = 1
+        qty = max(1, min(qty, MAX_PRODUCT_QUANTITY))
+        if qty != cantidad:
+            carrito[pid] = qty
+            changed = True
+    if changed:
+        request.session['carrito'] = carrito
+    return carrito
+
+
+class CarritoCotizado:
+    """
+    Resultado de cotizar un carrito: líneas, total, faltantes y productos inexistentes.
+    `productos` mapea el id (int) de cada producto encontrado a su instancia.
+    """
+
+    def __init__(self):
+        self.lineas = []
+        self.total = Decimal('0')
+        self.faltantes = []
+        self.inexistentes = []
+        self.deshabilitados = []
+        self.productos = {}
+
+    @property
+    def total_limit_exceeded(self) -> bool:
+        return self.total > MAX_ORDER_TOTAL
+
+    @property
+    def allow_checkout(self) -> bool:
+        return bool(self.lineas) and not self.faltantes and not self.total_limit_exceeded
+
+    def as_json(self) -> dict:
+        return {
+            'items': [
+                {
+                    'id': linea['id'],
+                    'nombre': linea['nombre'],
+                    'precio': str(linea['precio']),
+                    'cantidad': linea['cantidad'],
+                    'subtotal': str(linea['subtotal']),
+                    'stock': linea['stock'],
+                    'activo': linea['activo'],
+                    'comprable': linea.get('comprable', False),
+                }
+                for linea in self.lineas
+            ],
+            'total': str(self.total),
+            'count': sum(linea['cantidad'] for linea in self.lineas),
+            'allow_checkout': self.allow_checkout,
+            'total_limit_exceeded': self.total_limit_exceeded,
+            'inexistentes': list(self.inexistentes),
+        }
+
+
+def _imagen_linea(producto) -> str:
+    if producto.imagen_hash:
+        return thumb_url(producto.imagen_hash, 240)
+    return producto.imagen.url if getattr(producto, 'imagen', None) else ''
+
+
+def cotizar_carrito(carrito: dict, clave=None) -> CarritoCotizado:
+    """
+    Cotiza el carrito cargando todos sus productos en una sola consulta.
+    El stock informado es el disponible: stock - reservas activas de otros compradores.
+    """
+    cotizado = CarritoCotizado()
+
+    ids = []
+    for pid in carrito:
+        try:
+            ids.append(int(pid))
+        except (TypeError, ValueError):
+            continue
+
+    productos = {}
+    if ids:
+        productos = Producto.objects.annotate(reservado=reservado_agregado(clave)).in_bulk(ids)
+    cotizado.productos = productos
+
+    for pid, cantidad in carrito.items():
+        try:
+            producto = productos.get(int(pid))
+        except (TypeError, ValueError):
+            producto = None
+
+        if producto is None:
+            cotizado.inexistentes.append(pid)
+            cotizado.faltantes.append({
+                'nombre': f'Producto #{pid} no disponible',
+                'disponible': 0,
+                'cantidad': cantidad,
+            })
+            cotizado.lineas.append({
+                'id': pid,
+                'nombre': 'Producto no disponible',
+                'precio': Decimal('0'),
+                'cantidad': cantidad,
+                'subtotal': Decimal('0'),
+                'imagen': '',
+                'stock_ok': False,
+                'stock': 0,
+                'activo': False,
+            })
+            continue
+
+        disponible = max(0, producto.stock - producto.reservado)
+        subtotal = producto.precio * cantidad
+        cotizado.total += subtotal
+        stock_ok = disponible >= cantidad
+        activo_ok = producto.activo
+        if not activo_ok:
+            cotizado.deshabilitados.append(producto)
+        if not stock_ok or not activo_ok:
+            cotizado.faltantes.append({
+                'nombre': producto.nombre,
+                'disponible': disponible,
+                'cantidad': cantidad,
+            })
+        cotizado.lineas.append({
+            'id': producto.id,
+            'nombre': producto.nombre,
+            'precio': producto.precio,
+            'cantidad': cantidad,
+            'subtotal': subtotal,
+            'imagen': _imagen_linea(producto),
+            'stock_ok': stock_ok,
+            'stock': disponible,
+            'activo': activo_ok,
+            'comprable': stock_ok and activo_ok,
+        })
+
+    return cotizado
+
+
+def _descontar_stock(cantidades: dict, clave=None) -> bool:
+    """
+    Descuenta stock con UPDATEs condicionales (stock >= cantidad + reservas ajenas activas)
+    sin reescribir la fila completa.
+    Devuelve False si alguna línea no pudo descontarse; el llamador debe revertir la transacción.
+    """
+    items = list(cantidades.items())
+    reservado = reservado_subquery(clave)
+    for start in range(0, len(items), STOCK_UPDATE_CHUNK):
+        chunk = items[start:start + STOCK_UPDATE_CHUNK]
+        requerido = Case(
+            *[When(id=pid, then=Value(cantidad)) for pid, cantidad in chunk],
+            output_field=IntegerField(),
+        )
+        nuevo_stock = Case(
+            *[When(id=pid, then=F('stock') - cantidad) for pid, cantidad in chunk],
+            default=F('stock'),
+            output_field=PositiveIntegerField(),
+        )
+        updated = (
+            Producto.objects
+            .filter(id__in=[pid for pid, _ in chunk], activo=True, stock__gte=reservado + requerido)
+            .update(stock=nuevo_stock)
+        )
+        if updated != len(chunk):
+            return False
+    invalidar_low_stock()
+    return True
+
+
+def _faltantes(cantidades: dict, clave=None) -> list:
+    productos = (
+        Producto.objects
+        .annotate(reservado=reservado_agregado(clave))
+        .only('id', 'nombre', 'stock', 'activo')
+        .in_bulk(list(cantidades))
+    )
+    faltantes = []
+    for pid, cantidad in cantidades.items():
+        prod = productos.get(pid)
+        if prod is None:
+            faltantes.append((f'Producto #{pid} no disponible', 0, cantidad))
+            continue
+        disponible = max(0, prod.stock - prod.reservado)
+        if not prod.activo:
+            faltantes.append((f'{prod.nombre} (deshabilitado)', disponible, cantidad))
+        elif disponible < cantidad:
+            faltantes.append((prod.nombre, disponible, cantidad))
+    return faltantes
+
+
+def registrar_pedido(cliente, carrito: dict, clave=None, token=None) -> Pedido:
+    """
+    Convierte el carrito en un Pedido: un UPDATE condicional de stock por cada STOCK_UPDATE_CHUNK
+    líneas, una lectura de precios, un INSERT del pedido y un bulk_create de los detalles.
+    El UPDATE va primero para que la transacción tome el lock de escritura de entrada
+    (en SQLite, pasar de lectura a escritura dentro de la transacción falla sin esperar).
+    Las reservas de otros compradores se respetan; las de `clave` se consumen.
+    Con `token` el pedido queda asociado a la clave de idempotencia en la misma transacción;
+    si otro envío ya la registró se levanta PedidoDuplicado sin tocar el stock.
+    Levanta StockInsuficiente o TotalExcedido (sin efectos en la base) si no se puede confirmar.
+    """
+    cantidades = {}
+    for pid, cantidad in carrito.items():
+        try:
+            key = int(pid)
+        except (TypeError, ValueError):
+            raise StockInsuficiente([(f'Producto #{pid} no disponible', 0, cantidad)])
+        cantidades[key] = cantidades.get(key, 0) + cantidad
+
+    try:
+        with transaction.atomic():
+            if not _descontar_stock(cantidades, clave):
+                raise StockInsuficiente(_faltantes(cantidades, clave))
+
+            precios = dict(Producto.objects.filter(id__in=cantidades).values_list('id', 'precio'))
+            subtotales = {pid: precios[int(pid)] * cantidad for pid, cantidad in carrito.items()}
+            total = sum(subtotales.values(), Decimal('0'))
+            if total > MAX_ORDER_TOTAL:
+                raise TotalExcedido()
+
+            pedido = Pedido.objects.create(
+                cliente_id=cliente.pk,
+                nombre_cliente=cliente.username,
+                correo=cliente.email,
+                direccion=cliente.direccion or 'Sin dirección',
+                total=total,
+            )
+            DetallePedido.objects.bulk_create([
+                DetallePedido(pedido=pedido, producto_id=int(pid), cantidad=cantidad, subtotal=subtotales[pid])
+                for pid, cantidad in carrito.items()
+            ])
+            liberar_reservas(clave)
+            if token:
+                ClaveIdempotencia.objects.create(token=token, cliente_id=cliente.pk, pedido=pedido)
+    except IntegrityError:
+        # otro envío con el mismo token ganó la carrera: este pedido se revirtió completo
+        original = pedido_por_token(cliente, token)
+        if original is None:
+            raise
+        raise PedidoDuplicado(original)
+    return pedido
@@ -0,0 +1,65 @@
+import csv
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+EXPORT_CHUNK = 2000  # filas por lectura del cursor (.iterator(chunk_size=...))
+CSV_FILAS_POR_ENVIO = 500  # filas por trozo de la respuesta (menos llamadas al servidor WSGI)
+
+
+class _Eco:
+    """
+    "Archivo" para csv.writer que devuelve la línea en vez de guardarla.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _es_numero(texto: str) -> bool:
+    try:
+        float(texto)
+    except ValueError:
+        return False
+    return True
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'sí' if valor else 'no'
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M')
+    texto = str(valor)
+    # evita que Excel/LibreOffice interpreten como fórmula un texto ingresado por el cliente
+    # (los números con signo, como un teléfono +569..., se dejan tal cual)
+    if texto[:1] in ('=', '@', '\t', '\r') or (texto[:1] in ('+', '-') and not _es_numero(texto)):
+        return "'" + texto
+    return texto
+
+
+def csv_streaming(filename: str, encabezado: list, filas) -> StreamingHttpResponse:
+    """
+    Respuesta CSV que se escribe mientras se recorre `filas` (p. ej. un values_list().iterator()):
+    la memoria no depende de cuántas filas haya.
+    """
+    writer = csv.writer(_Eco())
+
+    def generar():
+        # BOM para que Excel abra el UTF-8 con tildes correctas
+        yield '\ufeff' + writer.writerow(encabezado)
+        lote = []
+        for fila in filas:
+            lote.append(writer.writerow([_celda(v) for v in fila]))
+            if len(lote) >= CSV_FILAS_POR_ENVIO:
+                yield ''.join(lote)
+                lote = []
+        if lote:
+            yield ''.join(lote)
+
+    response = StreamingHttpResponse(generar(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,44 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import HistorialCliente
+from .pagination import keyset_page
+
+
+HISTORIAL_PAGE_SIZE = 20  # acciones por tramo al expandir un cliente
+HISTORIAL_ORDEN = ('-fecha', '-id')
+
+
+def consulta_ultimas_acciones(cliente_ids):
+    """
+    Última acción de cada cliente de `cliente_ids`: ROW_NUMBER() por cliente y solo la fila 1,
+    así se lee una fila por cliente y no su historial completo.
+    """
+    return (
+        HistorialCliente.objects
+        .filter(cliente_id__in=cliente_ids)
+        .annotate(fila=Window(
+            RowNumber(),
+            partition_by=F('cliente_id'),
+            order_by=[F(campo.lstrip('-')).desc() for campo in HISTORIAL_ORDEN],
+        ))
+        .filter(fila=1)
+        .only('cliente_id', 'accion', 'fecha')
+    )
+
+
+def ultimas_acciones(cliente_ids) -> dict:
+    """
+    cliente_id -> HistorialCliente con su última acción (una consulta; los que no tienen historial no aparecen).
+    """
+    if not cliente_ids:
+        return {}
+    return {h.cliente_id: h for h in consulta_ultimas_acciones(cliente_ids)}
+
+
+def pagina_historial(cliente_id: int, cursor: str | None):
+    """
+    Tramo del historial de un cliente, más reciente primero. Devuelve (acciones, next_cursor).
+    """
+    qs = HistorialCliente.objects.filter(cliente_id=cliente_id).only('accion', 'fecha')
+    return keyset_page(qs, HISTORIAL_ORDEN, cursor, HISTORIAL_PAGE_SIZE)
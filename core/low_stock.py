@@ -0,0 +1,61 @@
+import bisect
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Producto
+
+
+LOW_STOCK_MAX_THRESHOLD = 20  # el umbral configurable por sesión va de 1 a 20
+VERSION_KEY = 'low_stock:version'
+INDEX_TTL = 60 * 60
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidar_low_stock() -> None:
+    """
+    Invalida el índice en todos los workers subiendo la versión (las claves viejas expiran solas).
+    Si hay una transacción abierta se aplica al hacer commit.
+    """
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def _indice():
+    """
+    Snapshot ordenado por (stock, id) de los productos activos con stock <= LOW_STOCK_MAX_THRESHOLD.
+    Devuelve (stocks, filas) donde `stocks` es la columna de stock para hacer bisect.
+    """
+    key = f'low_stock:index:{_version()}'
+    filas = cache.get(key)
+    if filas is None:
+        filas = list(
+            Producto.objects
+            .filter(activo=True, stock__lte=LOW_STOCK_MAX_THRESHOLD)
+            .order_by('stock', 'id')
+            .values('id', 'nombre', 'stock')
+        )
+        cache.set(key, filas, INDEX_TTL)
+    return [f['stock'] for f in filas], filas
+
+
+def low_stock_products(threshold: int) -> list:
+    """
+    Productos activos con stock <= threshold (1..20), sin consultar la base si el índice está en caché.
+    """
+    stocks, filas = _indice()
+    return filas[:bisect.bisect_right(stocks, threshold)]
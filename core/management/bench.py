@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+
+
+def run_on_temp_db(command: str, args: list, profile: str | None = None):
+    """
+    Ejecuta `manage.py <command> --run ...` en un subproceso apuntando a una base SQLite temporal
+    (CAICAI_DB_PATH), para que los benchmarks no toquen db.sqlite3.
+    Devuelve el CompletedProcess con stdout/stderr capturados.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CAICAI_DB_PATH=os.path.join(tmp, 'bench.sqlite3'))
+        if profile:
+            env['CAICAI_DB_PROFILE'] = profile
+        cmd = [sys.executable, str(settings.BASE_DIR / 'manage.py'), command, '--run', *map(str, args)]
+        return subprocess.run(cmd, env=env, capture_output=True, text=True)
@@ -0,0 +1,58 @@
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from core.boletas import archivar_boleta, contenido_pedido
+from core.pdf import lineas_por_pagina
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuántas boletas detalladas (multipágina) por minuto genera el escritor de PDF en un '
+        'solo núcleo, escribiéndolas a un directorio temporal. No usa la base de datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--boletas', type=int, default=10_000)
+        parser.add_argument('--max-items', type=int, default=120, help='Ítems por pedido: uniforme entre 1 y este valor.')
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(0)
+        fecha = datetime(2025, 1, 31, 18, 30)
+        pedidos = []
+        for i in range(opts['boletas']):
+            items = [
+                (
+                    i + 1,
+                    rnd.randint(1, 5),
+                    f'Polerón (edición {rnd.randint(1, 999)}) talla {rnd.choice("SML")}',
+                    Decimal(rnd.randint(5, 60) * 1000),
+                )
+                for _ in range(rnd.randint(1, opts['max_items']))
+            ]
+            pedido = SimpleNamespace(
+                id=i + 1, nombre_cliente=f'cliente{i}', correo=f'c{i}@caicai.cl', direccion='Av. Siempre Viva 742',
+                fecha=fecha, estado='finalizado', total=sum(item[3] for item in items),
+            )
+            pedidos.append(contenido_pedido(pedido, items))
+
+        por_pagina = lineas_por_pagina()
+        paginas = sum(-(-len(lines) // por_pagina) for _, lines in pedidos)
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            escritos = sum(
+                archivar_boleta(os.path.join(tmp, f'pedido_{n}.pdf'), title, lines)
+                for n, (title, lines) in enumerate(pedidos)
+            )
+            segundos = time.perf_counter() - t0
+
+        self.stdout.write(
+            f'{len(pedidos)} boletas · {paginas} páginas · {escritos / 1e6:.1f} MB en {segundos:.2f}s '
+            f'→ {len(pedidos) / segundos * 60:,.0f} boletas/min en un núcleo'
+        )
@@ -0,0 +1,77 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.management.bench import run_on_temp_db
+from core.models import Categoria, Producto
+from core.search import buscar_productos
+
+
+PALABRAS = [
+    'polerón', 'polera', 'pantalón', 'algodón', 'lana', 'camión', 'canción', 'corazón', 'montaña',
+    'estampado', 'bordado', 'negro', 'blanco', 'azul', 'rojo', 'verde', 'niño', 'niña', 'clásico',
+    'básico', 'oversize', 'capucha', 'cierre', 'bolsillo', 'térmico', 'deportivo', 'diseño', 'edición',
+]
+# vocabulario de relleno para que las palabras del catálogo tengan una selectividad realista
+RELLENO = [f'tela{i}' for i in range(3000)]
+CONSULTAS = ['poleron', 'algodon azul', 'capu', 'pantalon nino', 'termico negro', 'edicion', 'xyz']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda del catálogo con icontains frente a FTS5 (bm25) sobre una base '
+        'temporal con N productos (no toca db.sqlite3).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--run', action='store_true', help='(interno) ejecuta sobre la base actual.')
+
+    def handle(self, *args, **opts):
+        if not opts['run']:
+            result = run_on_temp_db('bench_busqueda', [
+                '--productos', opts['productos'],
+                '--repeticiones', opts['repeticiones'],
+            ])
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stderr.write(result.stderr)
+            return
+
+        call_command('migrate', verbosity=0)
+        rnd = random.Random(0)
+        categorias = Categoria.objects.bulk_create([Categoria(nombre=n) for n in ('Poleras', 'Polerones', 'Pantalones', 'Accesorios')])
+        t0 = time.perf_counter()
+        lote = []
+        for i in range(opts['productos']):
+            lote.append(Producto(
+                nombre=' '.join(rnd.sample(PALABRAS, 3)).capitalize(),
+                descripcion=' '.join(rnd.choices(PALABRAS, k=2) + rnd.choices(RELLENO, k=18)),
+                precio=Decimal('9990'),
+                stock=10,
+                categoria=rnd.choice(categorias),
+            ))
+            if len(lote) == 5000:
+                Producto.objects.bulk_create(lote)
+                lote = []
+        Producto.objects.bulk_create(lote)
+        self.stdout.write(f'{opts["productos"]} productos insertados (con triggers FTS) en {time.perf_counter() - t0:.1f}s')
+
+        base = Producto.objects.filter(activo=True)
+        for consulta in CONSULTAS:
+            legacy = self._medir(opts['repeticiones'], lambda: list(
+                base.filter(Q(nombre__icontains=consulta) | Q(descripcion__icontains=consulta))[:48]
+            ))
+            fts = self._medir(opts['repeticiones'], lambda: list(buscar_productos(base, consulta)[:48]))
+            self.stdout.write(f'{consulta!r:>18}: icontains {legacy:7.1f}ms | fts5 {fts:7.1f}ms')
+
+    def _medir(self, repeticiones, fn):
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            fn()
+        return (time.perf_counter() - t0) / repeticiones * 1000
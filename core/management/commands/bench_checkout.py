@@ -0,0 +1,129 @@
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from core.cart import StockInsuficiente, TotalExcedido, registrar_pedido
+from core.management.bench import run_on_temp_db
+from core.models import DetallePedido, Pedido, Producto
+
+
+BENCH_PREFIX = '__bench_checkout__'
+
+
+def _checkout_legacy(cliente, carrito):
+    """
+    Fase de confirmación previa: select_for_update + create + save() por línea.
+    """
+    with transaction.atomic():
+        productos = {}
+        for pid, cantidad in carrito.items():
+            prod = Producto.objects.select_for_update().get(id=pid)
+            if prod.stock < cantidad:
+                raise StockInsuficiente([(prod.nombre, prod.stock, cantidad)])
+            productos[pid] = prod
+        pedido = Pedido.objects.create(
+            nombre_cliente=cliente.username,
+            correo=cliente.email,
+            direccion=cliente.direccion,
+            total=Decimal('0'),
+        )
+        total = Decimal('0')
+        for pid, cantidad in carrito.items():
+            prod = productos[pid]
+            subtotal = prod.precio * cantidad
+            total += subtotal
+            DetallePedido.objects.create(pedido=pedido, producto=prod, cantidad=cantidad, subtotal=subtotal)
+            prod.stock -= cantidad
+            prod.save()
+        pedido.total = total
+        pedido.save()
+    return pedido
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el throughput de confirmación de pedidos con N compradores concurrentes, '
+        'comparando la ruta anterior (save por línea) con registrar_pedido (bulk). '
+        'Corre sobre una base temporal (no toca db.sqlite3).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=16, help='Compradores concurrentes (hilos).')
+        parser.add_argument('--orders', type=int, default=10, help='Pedidos por comprador.')
+        parser.add_argument('--lines', type=int, default=20, help='Líneas por carrito.')
+        parser.add_argument('--mode', choices=['legacy', 'bulk', 'both'], default='both')
+        parser.add_argument('--run', action='store_true', help='(interno) ejecuta sobre la base actual.')
+
+    def handle(self, *args, **opts):
+        if not opts['run']:
+            result = run_on_temp_db('bench_checkout', [
+                '--buyers', opts['buyers'],
+                '--orders', opts['orders'],
+                '--lines', opts['lines'],
+                '--mode', opts['mode'],
+            ])
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stderr.write(result.stderr)
+            return
+
+        call_command('migrate', verbosity=0)
+        modes = ['legacy', 'bulk'] if opts['mode'] == 'both' else [opts['mode']]
+        for mode in modes:
+            self._run(mode, opts['buyers'], opts['orders'], opts['lines'])
+
+    def _run(self, mode, buyers, orders, lines):
+        checkout = _checkout_legacy if mode == 'legacy' else registrar_pedido
+        stock = buyers * orders + 1
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'{BENCH_PREFIX}{i}', precio=Decimal('1000'), stock=stock)
+            for i in range(lines)
+        ])
+        carrito = {str(p.id): 1 for p in productos}
+
+        stats = {'ok': 0, 'locked': 0, 'rechazados': 0}
+        latencies = []
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(buyers)
+
+        def buyer(n):
+            cliente = SimpleNamespace(pk=None, username=f'{BENCH_PREFIX}{n}', email=f'bench{n}@example.com', direccion='Bench')
+            start_barrier.wait()
+            for _ in range(orders):
+                t0 = time.perf_counter()
+                try:
+                    checkout(cliente, carrito)
+                    key = 'ok'
+                except OperationalError:
+                    key = 'locked'
+                except (StockInsuficiente, TotalExcedido):
+                    key = 'rechazados'
+                with lock:
+                    stats[key] += 1
+                    latencies.append(time.perf_counter() - t0)
+            connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(n,)) for n in range(buyers)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        close_old_connections()
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        self.stdout.write(
+            f'{mode:>6}: {stats["ok"]} pedidos en {elapsed:.2f}s '
+            f'({stats["ok"] / elapsed:.1f} pedidos/s), '
+            f'bloqueos={stats["locked"]}, rechazados={stats["rechazados"]}, p99={p99 * 1000:.1f}ms'
+        )
+
+        Pedido.objects.filter(nombre_cliente__startswith=BENCH_PREFIX).delete()
+        Producto.objects.filter(nombre__startswith=BENCH_PREFIX).delete()
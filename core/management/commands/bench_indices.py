@@ -0,0 +1,178 @@
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.historial import HISTORIAL_ORDEN, consulta_ultimas_acciones
+from core.low_stock import LOW_STOCK_MAX_THRESHOLD
+from core.management.bench import run_on_temp_db
+from core.models import Categoria, Cliente, HistorialCliente, Pedido, Producto, SolicitudConfeccion
+
+
+MODELOS_INDEXADOS = (HistorialCliente, Pedido, Producto, SolicitudConfeccion)
+ESTADOS_PEDIDO = [value for value, _ in Pedido.ESTADOS]
+ESTADOS_CONFECCION = [value for value, _ in SolicitudConfeccion.ESTADO_CHOICES]
+DIAS_HISTORIA = 1100  # unos tres años de datos
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga volúmenes realistas en una base temporal (no toca db.sqlite3) y muestra, para las '
+        'consultas de cada vista, el EXPLAIN QUERY PLAN y el tiempo con y sin los índices compuestos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=200_000)
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--clientes', type=int, default=20_000)
+        parser.add_argument('--historial', type=int, default=500_000)
+        parser.add_argument('--solicitudes', type=int, default=50_000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--run', action='store_true', help='(interno) ejecuta sobre la base actual.')
+
+    def handle(self, *args, **opts):
+        if not opts['run']:
+            result = run_on_temp_db('bench_indices', [
+                '--pedidos', opts['pedidos'],
+                '--productos', opts['productos'],
+                '--clientes', opts['clientes'],
+                '--historial', opts['historial'],
+                '--solicitudes', opts['solicitudes'],
+                '--repeticiones', opts['repeticiones'],
+            ])
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stderr.write(result.stderr)
+            return
+
+        call_command('migrate', verbosity=0)
+        t0 = time.perf_counter()
+        self._poblar(random.Random(0), opts)
+        self.stdout.write(f'Datos cargados en {time.perf_counter() - t0:.1f}s\n')
+
+        consultas = self._consultas(random.Random(1))
+        con = {nombre: (self._medir(opts['repeticiones'], fn), self._plan(qs)) for nombre, qs, fn in consultas}
+
+        self._quitar_indices()
+        sin = {nombre: (self._medir(opts['repeticiones'], fn), self._plan(qs)) for nombre, qs, fn in consultas}
+
+        for nombre, _, _ in consultas:
+            (ms_con, plan_con), (ms_sin, plan_sin) = con[nombre], sin[nombre]
+            self.stdout.write(f'{nombre}: con índices {ms_con:.1f}ms | sin índices {ms_sin:.1f}ms')
+            self.stdout.write(f'    con: {plan_con}')
+            self.stdout.write(f'    sin: {plan_sin}')
+
+    def _poblar(self, rnd, opts):
+        categorias = Categoria.objects.bulk_create([
+            Categoria(nombre=n) for n in ('Poleras', 'Polerones', 'Pantalones', 'Accesorios', 'Gorros')
+        ])
+        self._en_lotes(Producto, (
+            Producto(
+                nombre=f'Producto {i}', descripcion='Prenda de algodón', precio=Decimal('9990'),
+                stock=rnd.randint(0, 200), categoria=rnd.choice(categorias), activo=rnd.random() < 0.9,
+            )
+            for i in range(opts['productos'])
+        ))
+        clientes = self._en_lotes(Cliente, (
+            Cliente(username=f'cliente{i}', email=f'cliente{i}@example.com', password='!')
+            for i in range(opts['clientes'])
+        ))
+        self._en_lotes(Pedido, (
+            Pedido(
+                cliente=c, nombre_cliente=c.username, correo=c.email, direccion='Santiago',
+                total=Decimal(rnd.randint(5, 200) * 1000), estado=rnd.choice(ESTADOS_PEDIDO),
+            )
+            for c in (rnd.choice(clientes) for _ in range(opts['pedidos']))
+        ))
+        self._en_lotes(HistorialCliente, (
+            HistorialCliente(cliente=c, nombre=c.username, correo=c.email, accion='Pedido -> finalizado')
+            for c in (rnd.choice(clientes) for _ in range(opts['historial']))
+        ))
+        self._en_lotes(SolicitudConfeccion, (
+            SolicitudConfeccion(
+                nombre='Cliente', correo=rnd.choice(clientes).email, telefono='+56911111111',
+                tipo_prenda='polera', descripcion_diseno='Logo bordado en el pecho',
+                estado=rnd.choice(ESTADOS_CONFECCION),
+            )
+            for _ in range(opts['solicitudes'])
+        ))
+        # auto_now_add fija "ahora" en bulk_create: se reparten las fechas en DIAS_HISTORIA días
+        segundos = DIAS_HISTORIA * 86400
+        with connection.cursor() as cursor:
+            for tabla, campo in (
+                ('core_pedido', 'fecha'),
+                ('core_historialcliente', 'fecha'),
+                ('core_solicitudconfeccion', 'fecha_creacion'),
+            ):
+                cursor.execute(
+                    f"UPDATE {tabla} SET {campo} = datetime('now', '-' || ((id * 7919) % {segundos}) || ' seconds')"
+                )
+
+    def _en_lotes(self, modelo, objetos, lote=5000):
+        creados, buffer = [], []
+        for obj in objetos:
+            buffer.append(obj)
+            if len(buffer) == lote:
+                creados += modelo.objects.bulk_create(buffer)
+                buffer = []
+        return creados + modelo.objects.bulk_create(buffer)
+
+    def _consultas(self, rnd):
+        """
+        (nombre, queryset, función a medir) con las mismas consultas que arman las vistas.
+        """
+        cliente = Cliente.objects.order_by('?').only('id', 'username', 'email').first()
+        pagina_clientes = list(Cliente.objects.order_by('username').values_list('id', flat=True)[:50])
+        categoria_id = Categoria.objects.values_list('id', flat=True).first()
+        hoy = timezone.localdate()
+        rango = (
+            timezone.make_aware(datetime.combine(hoy - timedelta(days=30), dt_time.min)),
+            timezone.make_aware(datetime.combine(hoy, dt_time.max)),
+        )
+
+        consultas = [
+            ('pedidos_list', Pedido.objects.order_by('-fecha', '-id')[:51]),
+            ('pedidos_list ?estado=pendiente', Pedido.objects.filter(estado='pendiente').order_by('-fecha', '-id')[:51]),
+            ('ventas_panel (últimos 30 días)', Pedido.objects.filter(fecha__range=rango).order_by('-fecha', '-id')[:50]),
+            ('mis_pedidos', Pedido.objects.filter(cliente=cliente).order_by('-fecha')),
+            ('alerta stock bajo', Producto.objects.filter(activo=True, stock__lte=LOW_STOCK_MAX_THRESHOLD)
+                .order_by('stock', 'id').values('id', 'nombre', 'stock')),
+            ('catálogo ?categoria=', Producto.objects.filter(activo=True, categoria_id=categoria_id).order_by('id')[:49]),
+            ('clientes_list (última acción)', consulta_ultimas_acciones(pagina_clientes)),
+            ('historial de un cliente', HistorialCliente.objects.filter(cliente=cliente).order_by(*HISTORIAL_ORDEN)[:21]),
+            ('solicitudes_confeccion_list', SolicitudConfeccion.objects.order_by('-fecha_creacion', '-id')[:51]),
+            ('solicitudes ?estado=pendiente', SolicitudConfeccion.objects.filter(estado='pendiente')
+                .order_by('-fecha_creacion', '-id')[:51]),
+            ('mis_solicitudes_confeccion', SolicitudConfeccion.objects.filter(
+                Q(cliente=cliente) | Q(cliente__isnull=True, correo=cliente.email)
+            ).order_by('-fecha_creacion')),
+        ]
+        # cada medición clona el queryset para no reutilizar su caché de resultados
+        return [(nombre, qs, lambda qs=qs: list(qs.all())) for nombre, qs in consultas]
+
+    def _plan(self, qs) -> str:
+        # sin QuerySet.explain(): con filtros sobre Window Django envuelve la consulta y el EXPLAIN queda adentro
+        sql, params = qs.query.get_compiler(using=qs.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' / '.join(detalle for *_, detalle in cursor.fetchall())
+
+    def _quitar_indices(self):
+        # los declarados en Meta.indexes; quedan los de PK, FK y unique
+        with connection.schema_editor() as editor:
+            for modelo in MODELOS_INDEXADOS:
+                for index in modelo._meta.indexes:
+                    editor.remove_index(modelo, index)
+
+    def _medir(self, repeticiones, fn):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            fn()
+        return (time.perf_counter() - t0) / repeticiones * 1000
@@ -0,0 +1,103 @@
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+
+from core.cart import StockInsuficiente, cotizar_carrito, registrar_pedido
+from core.management.bench import run_on_temp_db
+from core.models import Producto
+from core.reservas import reservar_carrito
+
+
+def _worker(args):
+    """
+    Emula un worker de gunicorn: mezcla lecturas de carrito, inicios de checkout (reservas)
+    y confirmaciones de pedido durante `seconds`.
+    Tras cada operación se cierra la conexión como al final de un request (respeta CONN_MAX_AGE).
+    """
+    n, seconds, write_ratio, product_ids = args
+    connections.close_all()  # no compartir la conexión heredada del proceso padre
+    rnd = random.Random(n)
+    cliente = SimpleNamespace(pk=None, username=f'bench{n}', email=f'bench{n}@example.com', direccion='Bench')
+    latencias = []
+    errores = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        carrito = {str(pid): 1 for pid in rnd.sample(product_ids, 5)}
+        t0 = time.perf_counter()
+        try:
+            r = rnd.random()
+            if r < write_ratio / 2:
+                reservar_carrito(f'bench:{n}', {int(pid): q for pid, q in carrito.items()})
+            elif r < write_ratio:
+                registrar_pedido(cliente, carrito, clave=f'bench:{n}')
+            else:
+                cotizar_carrito(carrito)
+        except OperationalError:
+            errores += 1
+        except StockInsuficiente:
+            pass
+        latencias.append(time.perf_counter() - t0)
+        close_old_connections()
+    connections.close_all()
+    return latencias, errores
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de concurrencia SQLite: N procesos leyendo carritos y confirmando pedidos. '
+        'Compara los perfiles CAICAI_DB_PROFILE=dev y production sobre bases temporales '
+        '(no toca db.sqlite3) e informa errores de "database is locked" y latencia p99.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument('--profile', choices=['dev', 'production', 'both'], default='both')
+        parser.add_argument('--run', action='store_true', help='(interno) ejecuta el perfil actual.')
+
+    def handle(self, *args, **opts):
+        if opts['run']:
+            return self._run(opts)
+
+        profiles = ['dev', 'production'] if opts['profile'] == 'both' else [opts['profile']]
+        for profile in profiles:
+            result = run_on_temp_db('bench_sqlite', [
+                '--workers', opts['workers'],
+                '--seconds', opts['seconds'],
+                '--write-ratio', opts['write_ratio'],
+            ], profile=profile)
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stderr.write(result.stderr)
+
+    def _run(self, opts):
+        call_command('migrate', verbosity=0)
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'bench {i}', precio=Decimal('1000'), stock=10**6) for i in range(200)
+        ])
+        product_ids = [p.id for p in productos]
+        connections.close_all()
+
+        ctx = multiprocessing.get_context('fork')
+        args = [(n, opts['seconds'], opts['write_ratio'], product_ids) for n in range(opts['workers'])]
+        with ctx.Pool(opts['workers']) as pool:
+            resultados = pool.map(_worker, args)
+
+        latencias = sorted(lat for lats, _ in resultados for lat in lats)
+        errores = sum(err for _, err in resultados)
+        total = len(latencias)
+        p50 = latencias[total // 2] if total else 0
+        p99 = latencias[min(total - 1, int(total * 0.99))] if total else 0
+        self.stdout.write(
+            f'{settings.DB_PROFILE:>10}: {total} ops en {opts["seconds"]:.0f}s '
+            f'({total / opts["seconds"]:.0f} ops/s), database locked={errores}, '
+            f'p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms'
+        )
@@ -0,0 +1,122 @@
+import os
+import posixpath
+import shutil
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.banner import invalidar_banner
+from core.models import BannerImagen, Producto
+from core.thumbnails import generar_derivados, hash_archivo
+
+
+def _enlazar(origen: str, destino: str) -> None:
+    # hard link: el nombre nuevo existe antes de tocar la base y no ocupa bytes extra
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+class Command(BaseCommand):
+    help = (
+        'Renombra las imágenes de productos por hash de contenido, hace que las filas con bytes '
+        'idénticos compartan un solo archivo y reporta los bytes recuperados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra lo que haría.')
+        parser.add_argument(
+            '--huerfanos', action='store_true',
+            help='Elimina también los archivos sin referencias que son copias exactas de otro.',
+        )
+
+    def handle(self, *args, **opts):
+        storage = Producto._meta.get_field('imagen').storage
+        dry_run = opts['dry_run']
+
+        productos = list(Producto.objects.exclude(imagen='').exclude(imagen__isnull=True).only('id', 'imagen', 'imagen_hash'))
+        fijadas = list(BannerImagen.objects.all())
+        referenciados = {p.imagen.name for p in productos} | {b.ruta for b in fijadas}
+
+        # todos los archivos de las carpetas usadas, agrupados por contenido
+        grupos = defaultdict(list)
+        for carpeta in sorted({posixpath.dirname(p.imagen.name) for p in productos}):
+            base = storage.path(carpeta)
+            if not os.path.isdir(base):
+                continue
+            for fname in sorted(os.listdir(base)):
+                ruta = os.path.join(base, fname)
+                if fname.endswith('.tmp') or not os.path.isfile(ruta):
+                    continue
+                grupos[hash_archivo(ruta)].append(posixpath.join(carpeta, fname))
+
+        nuevos = {}       # nombre viejo -> nombre por contenido
+        a_enlazar = []    # (viejo, nuevo) cuando el nombre por contenido aún no existe
+        a_borrar = []
+        for digest, nombres in grupos.items():
+            canonico = next((n for n in nombres if posixpath.splitext(posixpath.basename(n))[0] == digest), None)
+            if canonico is None:
+                origen = next((n for n in nombres if n in referenciados), None)
+                if origen is None:
+                    if not opts['huerfanos'] or len(nombres) == 1:
+                        continue
+                    canonico = nombres[0]  # sin referencias: se conserva una copia con su nombre
+                else:
+                    _, ext = posixpath.splitext(origen)
+                    canonico = posixpath.join(posixpath.dirname(origen), digest + ext.lower())
+                    a_enlazar.append((origen, canonico))
+            for nombre in nombres:
+                if nombre == canonico:
+                    continue
+                if nombre in referenciados:
+                    nuevos[nombre] = canonico
+                    a_borrar.append(nombre)
+                elif opts['huerfanos']:
+                    a_borrar.append(nombre)
+
+        # el origen de un enlace sigue ocupando disco bajo el nombre nuevo: no se cuenta
+        enlazados = {viejo for viejo, _ in a_enlazar}
+        recuperados = sum(os.path.getsize(storage.path(n)) for n in a_borrar if n not in enlazados)
+        cambiados = [p for p in productos if p.imagen.name in nuevos]
+
+        for viejo, nuevo in sorted(nuevos.items()):
+            self.stdout.write(f'{viejo} -> {nuevo}')
+        if dry_run:
+            self.stdout.write(self.style.WARNING(
+                f'[dry-run] filas a reescribir: {len(cambiados)} · archivos a eliminar: {len(a_borrar)} '
+                f'· bytes a recuperar: {recuperados}'
+            ))
+            return
+
+        for viejo, nuevo in a_enlazar:
+            if not storage.exists(nuevo):
+                _enlazar(storage.path(viejo), storage.path(nuevo))
+
+        # imagen_hash solo apunta a miniaturas que existen (catálogo y carrito arman el srcset con él)
+        hashes = {}
+        for nombre in sorted({nuevos[p.imagen.name] for p in cambiados}):
+            digest = posixpath.splitext(posixpath.basename(nombre))[0]
+            try:
+                generar_derivados(storage.path(nombre), digest)
+            except (OSError, ValueError):
+                digest = ''
+            hashes[nombre] = digest
+
+        with transaction.atomic():
+            for producto in cambiados:
+                producto.imagen.name = nuevos[producto.imagen.name]
+                producto.imagen_hash = hashes[producto.imagen.name]
+            Producto.objects.bulk_update(cambiados, ['imagen', 'imagen_hash'], batch_size=500)
+            for viejo, nuevo in nuevos.items():
+                BannerImagen.objects.filter(ruta=viejo).update(ruta=nuevo)
+            transaction.on_commit(invalidar_banner)
+
+        for nombre in a_borrar:
+            storage.delete(nombre)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Filas reescritas: {len(cambiados)} · archivos eliminados: {len(a_borrar)} '
+            f'· bytes recuperados: {recuperados}'
+        ))
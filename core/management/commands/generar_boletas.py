@@ -0,0 +1,72 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.boletas import BOLETA_TIPOS, archivar_boleta, con_boleta, leer_contenidos, ruta_archivo
+
+# lotes enviados al pool por worker sin esperar resultado: cada uno retiene en memoria el contenido
+# de sus boletas, así que la lectura se frena hasta que termina el más antiguo
+EN_VUELO_POR_WORKER = 2
+
+def _archivar_lote(lote):
+    return sum(archivar_boleta(path, title, lines) for path, title, lines in lote)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera en paralelo las boletas que faltan en BOLETAS_ROOT (pedidos finalizados y '
+        'confecciones aceptadas). Reanudable: solo escribe las que aún no existen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--lote', type=int, default=200, help='Boletas por tarea del pool.')
+        parser.add_argument('--forzar', action='store_true', help='Regenera también las existentes.')
+
+    def _pendientes(self, existentes, forzar):
+        """
+        Una consulta de ids por tipo cruzada con un único listado del directorio; el contenido
+        de las que faltan se lee después en bloques (con el detalle precargado).
+        """
+        for tipo in BOLETA_TIPOS:
+            ids = [
+                pk for pk in con_boleta(tipo).order_by('id').values_list('id', flat=True)
+                if forzar or f'{tipo}_{pk}.pdf' not in existentes
+            ]
+            for obj, title, lines in leer_contenidos(tipo, ids):
+                yield ruta_archivo(tipo, obj.id), title, lines
+
+    def handle(self, *args, **opts):
+        os.makedirs(settings.BOLETAS_ROOT, exist_ok=True)
+        existentes = {e.name for e in os.scandir(settings.BOLETAS_ROOT) if e.name.endswith('.pdf')}
+
+        inicio = time.perf_counter()
+        total = escritos = 0
+        lote = []
+        workers = max(1, opts['workers'])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = deque()
+            for item in self._pendientes(existentes, opts['forzar']):
+                lote.append(item)
+                if len(lote) >= opts['lote']:
+                    if len(futuros) >= EN_VUELO_POR_WORKER * workers:
+                        escritos += futuros.popleft().result()
+                    futuros.append(pool.submit(_archivar_lote, lote))
+                    total += len(lote)
+                    lote = []
+            if lote:
+                futuros.append(pool.submit(_archivar_lote, lote))
+                total += len(lote)
+            while futuros:
+                escritos += futuros.popleft().result()
+
+        segundos = time.perf_counter() - inicio
+        por_segundo = total / segundos if segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Boletas generadas: {total} ({len(existentes)} ya estaban archivadas) · {escritos / 1e6:.1f} MB '
+            f'en {segundos:.2f}s · {por_segundo:.0f} boletas/s'
+        ))
@@ -0,0 +1,44 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.models import Producto
+from core.thumbnails import procesar_imagen
+
+
+def _procesar(args):
+    pk, path = args
+    try:
+        return pk, procesar_imagen(path)
+    except (OSError, ValueError):
+        return pk, ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera las miniaturas WebP/JPEG de las imágenes de productos en un pool de procesos '
+        'y actualiza imagen_hash. Solo se escriben los derivados que aún no existen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **opts):
+        productos = {
+            p.pk: p for p in Producto.objects.exclude(imagen='').only('id', 'imagen', 'imagen_hash')
+        }
+        trabajos = [(p.pk, p.imagen.path) for p in productos.values()]
+
+        cambiados = []
+        with ProcessPoolExecutor(max_workers=max(1, opts['workers'])) as pool:
+            for pk, digest in pool.map(_procesar, trabajos, chunksize=8):
+                producto = productos[pk]
+                if digest != producto.imagen_hash:
+                    producto.imagen_hash = digest
+                    cambiados.append(producto)
+
+        Producto.objects.bulk_update(cambiados, ['imagen_hash'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imágenes procesadas: {len(trabajos)} · hashes actualizados: {len(cambiados)}'
+        ))
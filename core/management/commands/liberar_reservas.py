@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.reservas import liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Libera en bloque las reservas de stock vencidas (ejecutar periódicamente, p. ej. desde cron).'
+
+    def handle(self, *args, **opts):
+        eliminadas = liberar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'Reservas vencidas liberadas: {eliminadas}'))
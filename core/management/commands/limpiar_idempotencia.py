@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cart import ttl_idempotencia
+from core.models import ClaveIdempotencia
+
+
+class Command(BaseCommand):
+    help = 'Elimina las claves de idempotencia de pedidos más antiguas que IDEMPOTENCY_KEY_TTL.'
+
+    def handle(self, *args, **opts):
+        limite = timezone.now() - ttl_idempotencia()
+        eliminadas, _ = ClaveIdempotencia.objects.filter(creado__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f'Claves de idempotencia eliminadas: {eliminadas}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.tareas import ejecutar, por_ejecutar
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta las tareas del panel pendientes y reanuda las interrumpidas (en curso sin avance '
+        'reciente). Pensado para cron/systemd, o como único ejecutor con CAICAI_TAREAS_EN_HILO=0.'
+    )
+
+    def handle(self, *args, **opts):
+        ejecutadas = fallidas = 0
+        for tarea_id in list(por_ejecutar().order_by('id').values_list('id', flat=True)):
+            try:
+                if ejecutar(tarea_id, reintentar=True):
+                    ejecutadas += 1
+            except Exception as exc:
+                fallidas += 1
+                self.stderr.write(f'Tarea #{tarea_id} falló: {exc!r}')
+        self.stdout.write(self.style.SUCCESS(f'Tareas ejecutadas: {ejecutadas}, fallidas: {fallidas}'))
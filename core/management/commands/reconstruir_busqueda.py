@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import fts_disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice FTS5 de búsqueda de productos (nombre, descripción y categoría).'
+
+    def handle(self, *args, **opts):
+        if not fts_disponible():
+            raise CommandError('La búsqueda FTS5 solo está disponible con SQLite.')
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f'Productos indexados: {total}'))
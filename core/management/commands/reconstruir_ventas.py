@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core.models import VentaDiaria
+from core.ventas import calcular_resumen, reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el resumen diario de ventas (VentaDiaria) desde pedidos y solicitudes de '
+        'confección. Necesario tras cambios masivos hechos fuera del ORM o con QuerySet.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help='Solo compara el resumen guardado con el recalculado, sin escribir.',
+        )
+
+    def handle(self, *args, **opts):
+        if opts['verificar']:
+            esperado = {
+                (f.origen, f.dia, f.estado): (f.cantidad, f.total)
+                for f in calcular_resumen() if f.cantidad
+            }
+            guardado = {
+                (origen, dia, estado): (cantidad, total)
+                for origen, dia, estado, cantidad, total in VentaDiaria.objects.exclude(cantidad=0, total=0)
+                .values_list('origen', 'dia', 'estado', 'cantidad', 'total')
+            }
+            distintas = sorted(k for k in esperado.keys() | guardado.keys() if esperado.get(k) != guardado.get(k))
+            for clave in distintas[:20]:
+                self.stdout.write(f'{clave}: guardado={guardado.get(clave)} esperado={esperado.get(clave)}')
+            if distintas:
+                self.stdout.write(self.style.WARNING(f'Celdas distintas: {len(distintas)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS('El resumen está al día.'))
+            return
+
+        total = reconstruir_resumen()
+        self.stdout.write(self.style.SUCCESS(f'Filas del resumen: {total}'))
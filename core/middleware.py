@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.urls import resolve
 
 ALLOWED_FOR_BLOCKED = {
-    'home', 'catalogo',
+    'home', 'catalogo', 'catalogo_mas', 'boleta',
     'login_unificado', 'logout_unificado', 'registro_cliente',
 }
 
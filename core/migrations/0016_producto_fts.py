@@ -0,0 +1,65 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'core_producto_fts'
+
+_CATEGORIA_NOMBRE = "COALESCE((SELECT nombre FROM core_categoria WHERE id = {ref}.categoria_id), '')"
+
+CREATE_SQL = [
+    # unicode61 + remove_diacritics: "poleron" encuentra "Polerón"
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "nombre, descripcion, categoria, tokenize = 'unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_producto BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion, categoria)
+        VALUES (new.id, new.nombre, new.descripcion, {_CATEGORIA_NOMBRE.format(ref='new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_producto BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF nombre, descripcion, categoria_id ON core_producto BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion, categoria)
+        VALUES (new.id, new.nombre, new.descripcion, {_CATEGORIA_NOMBRE.format(ref='new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_categoria_au AFTER UPDATE OF nombre ON core_categoria BEGIN
+        UPDATE {FTS_TABLE} SET categoria = new.nombre
+        WHERE rowid IN (SELECT id FROM core_producto WHERE categoria_id = new.id);
+    END""",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_categoria_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+BACKFILL_SQL = f"""INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion, categoria)
+    SELECT p.id, p.nombre, p.descripcion, COALESCE(c.nombre, '')
+    FROM core_producto p LEFT JOIN core_categoria c ON c.id = p.categoria_id"""
+
+
+def crear_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL + [BACKFILL_SQL]:
+        schema_editor.execute(sql)
+
+
+def eliminar_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_fts, eliminar_fts),
+    ]
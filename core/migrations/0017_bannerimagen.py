@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BannerImagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta', models.CharField(max_length=255)),
+                ('orden', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['orden', 'id'],
+            },
+        ),
+    ]
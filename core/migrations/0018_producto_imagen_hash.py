@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:13
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# AddField en SQLite reconstruye core_producto: los triggers FTS de 0016 se quitan antes y se recrean después
+fts = import_module('core.migrations.0016_producto_fts')
+
+TRIGGERS_SQL = [sql for sql in fts.CREATE_SQL if sql.startswith('CREATE TRIGGER')]
+DROP_TRIGGERS_SQL = [sql for sql in fts.DROP_SQL if sql.startswith('DROP TRIGGER')]
+
+
+def crear_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+def quitar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_bannerimagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_triggers, crear_triggers),
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(crear_triggers, quitar_triggers),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_producto_imagen_hash'),
+    ]
+
+    # el storage no cambia el esquema: solo estado (evita que SQLite reconstruya core_producto)
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='producto',
+                    name='imagen',
+                    field=models.ImageField(blank=True, null=True, storage=core.storage.ContenidoStorage(), upload_to='productos/'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:38
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def poblar_resumen(apps, schema_editor):
+    # mismo GROUP BY que core.ventas.calcular_resumen, con los modelos históricos
+    VentaDiaria = apps.get_model('core', 'VentaDiaria')
+    filas = []
+    for origen, modelo, campo_fecha, campo_monto in (
+        ('pedido', 'Pedido', 'fecha', 'total'),
+        ('confeccion', 'SolicitudConfeccion', 'fecha_creacion', 'cotizacion_monto'),
+    ):
+        grupos = (
+            apps.get_model('core', modelo).objects
+            .order_by()
+            .annotate(dia=TruncDate(campo_fecha, tzinfo=timezone.get_default_timezone()))
+            .values('dia', 'estado')
+            .annotate(cantidad=Count('id'), total=Sum(campo_monto))
+        )
+        filas.extend(
+            VentaDiaria(origen=origen, dia=g['dia'], estado=g['estado'], cantidad=g['cantidad'], total=g['total'] or 0)
+            for g in grupos
+        )
+    VentaDiaria.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_producto_imagen_contenido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('origen', models.CharField(choices=[('pedido', 'Pedido'), ('confeccion', 'Confección')], max_length=20)),
+                ('estado', models.CharField(max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origen', 'dia', 'estado'), name='ventadiaria_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
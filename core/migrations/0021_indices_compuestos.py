@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialcliente',
+            index=models.Index(fields=['nombre', 'fecha'], name='historial_nombre_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['nombre_cliente', 'fecha'], name='pedido_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha'], name='pedido_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha'], name='pedido_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['stock', 'nombre'], name='producto_activo_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria'], name='producto_activo_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudconfeccion',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='solicitud_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudconfeccion',
+            index=models.Index(fields=['fecha_creacion'], name='solicitud_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudconfeccion',
+            index=models.Index(fields=['correo'], name='solicitud_correo_idx'),
+        ),
+    ]
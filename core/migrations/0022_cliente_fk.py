@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='historialcliente',
+            name='historial_nombre_fecha_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pedido',
+            name='pedido_cliente_fecha_idx',
+        ),
+        migrations.AddField(
+            model_name='historialcliente',
+            name='cliente',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historial', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='cliente',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='historialcliente',
+            index=models.Index(fields=['cliente', 'fecha'], name='historial_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', 'fecha'], name='pedido_cliente_id_fecha_idx'),
+        ),
+    ]
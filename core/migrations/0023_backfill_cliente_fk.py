@@ -0,0 +1,46 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+# filas por UPDATE; cada tramo se confirma por separado (migración no atómica), así que si se
+# interrumpe basta volver a correr `migrate`: los tramos ya enlazados se saltan por cliente IS NULL
+TRAMO = 5000
+
+
+def _enlazar(apps, modelo, campo_nombre, campo_fecha):
+    Modelo = apps.get_model('core', modelo)
+    Cliente = apps.get_model('core', 'Cliente')
+    # la cuenta con ese username que ya existía en la fecha de la fila (un username
+    # liberado al eliminar una cuenta y reutilizado después no hereda lo anterior)
+    cuenta = Subquery(
+        Cliente.objects
+        .filter(username=OuterRef(campo_nombre), date_joined__lte=OuterRef(campo_fecha))
+        .values('id')[:1]
+    )
+    pendientes = Modelo.objects.filter(cliente__isnull=True)
+    desde = 0
+    ultimo = pendientes.order_by('-id').values_list('id', flat=True).first() or 0
+    while desde < ultimo:
+        hasta = desde + TRAMO
+        with transaction.atomic():
+            pendientes.filter(id__gt=desde, id__lte=hasta).update(cliente_id=cuenta)
+        desde = hasta
+
+
+def enlazar_clientes(apps, schema_editor):
+    for modelo, campo_nombre, campo_fecha in (
+        ('Pedido', 'nombre_cliente', 'fecha'),
+        ('HistorialCliente', 'nombre', 'fecha'),
+    ):
+        _enlazar(apps, modelo, campo_nombre, campo_fecha)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0022_cliente_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(enlazar_clientes, migrations.RunPython.noop, elidable=True),
+    ]
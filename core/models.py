@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models import DEFERRED
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.hashers import make_password, check_password
 
+from .storage import contenido_storage
+
 class AdminUser(models.Model):
     username = models.CharField(max_length=100, unique=True)
     password = models.CharField(max_length=255)
@@ -27,40 +30,140 @@ class Producto(models.Model):
     descripcion = models.TextField(blank=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
-    imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
+    # nombre = hash del contenido: re-subir la misma imagen no crea otra copia
+    imagen = models.ImageField(upload_to='productos/', storage=contenido_storage, blank=True, null=True)
+    # hash del contenido de `imagen`; nombra las miniaturas en media/thumbs (vacío = sin miniaturas)
+    imagen_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
     activo = models.BooleanField(default=True)
 
+    class Meta:
+        # parciales sobre activo: en SQLite Django escribe filter(activo=True) como `WHERE "activo"`,
+        # sin "= 1", así que una columna activo al inicio del índice no se podría usar
+        indexes = [
+            # alerta de stock bajo: rango de stock, y el nombre para no tocar la tabla
+            models.Index(fields=['stock', 'nombre'], condition=models.Q(activo=True), name='producto_activo_stock_idx'),
+            # catálogo filtrado por categoría (keyset por id = rowid, sin ordenar)
+            models.Index(fields=['categoria'], condition=models.Q(activo=True), name='producto_activo_cat_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
 
-class Cliente(AbstractUser):
-    direccion = models.CharField(max_length=255, blank=True, null=True)
-    telefono = models.CharField(max_length=20, blank=True, null=True)
-    bloqueado = models.BooleanField(default=False)
+class BannerImagen(models.Model):
+    """
+    Imagen fijada para el banner del catálogo (ruta relativa a MEDIA_ROOT).
+    """
+    ruta = models.CharField(max_length=255)
+    orden = models.PositiveIntegerField(default=0)
 
-    def save(self, *args, **kwargs):
-        old_username = None
-        if self.pk:
-            try:
-                old_username = Cliente.objects.get(pk=self.pk).username
-            except Cliente.DoesNotExist:
-                old_username = None
+    class Meta:
+        ordering = ['orden', 'id']
+
+    def __str__(self):
+        return self.ruta
+
+
+class ReservaStock(models.Model):
+    """
+    Stock apartado al iniciar el checkout. `clave` identifica al comprador (usuario o sesión).
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    clave = models.CharField(max_length=64, db_index=True)
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['producto', 'expira'])]
 
+    def __str__(self):
+        return f'{self.producto_id} x {self.cantidad} ({self.clave})'
+
+
+class CamposRastreados:
+    """
+    Mixin de modelo: recuerda los valores con que se cargó la fila (from_db) para saber qué campos
+    cambiaron sin volver a consultar la base. save() sin update_fields escribe solo esos campos
+    (y nada si no cambió ninguno).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_cargados = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
+    def campos_modificados(self) -> list | None:
+        """
+        attnames de los campos que difieren de lo cargado (incluye diferidos ya asignados).
+        None si la instancia no viene de la base y no hay con qué comparar.
+        """
+        cargados = getattr(self, '_valores_cargados', None)
+        if cargados is None:
+            return None
+        modificados = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if field.attname not in cargados or cargados[field.attname] != self.__dict__[field.attname]:
+                modificados.append(field.attname)
+        return modificados
+
+    def _recordar(self, attnames) -> None:
+        cargados = getattr(self, '_valores_cargados', None)
+        if cargados is None:
+            cargados = self._valores_cargados = {}
+        for attname in attnames:
+            if attname in self.__dict__:
+                cargados[attname] = self.__dict__[attname]
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            modificados = self.campos_modificados()
+            if modificados is not None:
+                kwargs['update_fields'] = modificados
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._recordar(f.attname for f in self._meta.concrete_fields)
+        else:
+            self._recordar(self._meta.get_field(name).attname for name in update_fields)
 
-        # Si cambió el username, propaga a pedidos e historial
-        if old_username and old_username != self.username:
-            Pedido.objects.filter(nombre_cliente=old_username).update(nombre_cliente=self.username)
-            HistorialCliente.objects.filter(nombre=old_username).update(nombre=self.username)
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        nombres = fields if fields is not None else [f.attname for f in self._meta.concrete_fields]
+        self._recordar(self._meta.get_field(name).attname for name in nombres)
+
+
+class Cliente(CamposRastreados, AbstractUser):
+    direccion = models.CharField(max_length=255, blank=True, null=True)
+    telefono = models.CharField(max_length=20, blank=True, null=True)
+    bloqueado = models.BooleanField(default=False)
 
 class HistorialCliente(models.Model):
+    # dueño de la acción; nombre y correo quedan como estaban al registrarla (un cambio de
+    # username ya no reescribe el historial). Sin cliente: acciones sobre cuentas ya eliminadas.
+    cliente = models.ForeignKey(
+        'Cliente', on_delete=models.SET_NULL, null=True, blank=True, related_name='historial',
+        db_index=False,  # lo cubre historial_cliente_fecha_idx
+    )
     nombre = models.CharField(max_length=150)
     correo = models.EmailField()
     fecha = models.DateTimeField(auto_now_add=True)
     accion = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['cliente', 'fecha'], name='historial_cliente_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} - {self.accion} ({self.fecha:%d/%m/%Y})"
 
@@ -73,6 +176,11 @@ class Pedido(models.Model):
         ('rechazado', 'Rechazado'),
     ]
 
+    # nombre_cliente, correo y dirección son los datos al momento de la compra; la cuenta es `cliente`
+    cliente = models.ForeignKey(
+        'Cliente', on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos',
+        db_index=False,  # lo cubre pedido_cliente_id_fecha_idx
+    )
     nombre_cliente = models.CharField(max_length=100)
     correo = models.EmailField()
     direccion = models.CharField(max_length=200)
@@ -81,10 +189,33 @@ class Pedido(models.Model):
     total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
     motivo_rechazo = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # mis_pedidos
+            models.Index(fields=['cliente', 'fecha'], name='pedido_cliente_id_fecha_idx'),
+            # pedidos_list y ventas filtrados por estado, ordenados por fecha
+            models.Index(fields=['estado', 'fecha'], name='pedido_estado_fecha_idx'),
+            # los mismos listados sin filtro de estado, y los rangos de fechas
+            models.Index(fields=['fecha'], name='pedido_fecha_idx'),
+        ]
+
     def __str__(self):
         return f'Pedido #{self.id} - {self.nombre_cliente}'
 
 
+class ClaveIdempotencia(models.Model):
+    """
+    Token emitido con el formulario de confirmación; apunta al pedido que generó su primer envío.
+    """
+    token = models.CharField(max_length=64, unique=True)
+    cliente = models.ForeignKey('Cliente', on_delete=models.CASCADE, related_name='+')
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='+')
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.token} -> Pedido #{self.pedido_id}'
+
+
 class DetallePedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
@@ -140,3 +271,62 @@ class SolicitudConfeccion(models.Model):
 
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='solicitud_estado_fecha_idx'),
+            models.Index(fields=['fecha_creacion'], name='solicitud_fecha_idx'),
+            # mis_solicitudes_confeccion: solicitudes anónimas del mismo correo
+            models.Index(fields=['correo'], name='solicitud_correo_idx'),
+        ]
+
+
+class VentaDiaria(models.Model):
+    """
+    Cantidad y monto por día (hora local), origen y estado. La mantienen las señales de Pedido
+    y SolicitudConfeccion (core.ventas); `manage.py reconstruir_ventas` la rehace desde cero.
+    """
+    ORIGENES = [
+        ('pedido', 'Pedido'),
+        ('confeccion', 'Confección'),
+    ]
+
+    dia = models.DateField()
+    origen = models.CharField(max_length=20, choices=ORIGENES)
+    estado = models.CharField(max_length=20)
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origen', 'dia', 'estado'], name='ventadiaria_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.dia} {self.origen}/{self.estado}: {self.cantidad}'
+
+
+class Tarea(models.Model):
+    """
+    Trabajo largo lanzado desde el panel (core.tareas). `tipo` elige la función que lo ejecuta;
+    `procesados`/`total` son el avance que ve el administrador.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('terminada', 'Terminada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    total = models.PositiveIntegerField(default=0)
+    procesados = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'actualizada'], name='tarea_estado_idx')]
+
+    def __str__(self):
+        return f'{self.tipo} #{self.id} ({self.estado} {self.procesados}/{self.total})'
@@ -0,0 +1,177 @@
+import base64
+import json
+from datetime import date, time
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+
+
+def encode_cursor(values) -> str:
+    # isoformat() completo: DjangoJSONEncoder recorta los microsegundos y el cursor dejaría de ser exacto
+    if isinstance(values, (list, tuple)):
+        values = [v.isoformat() if isinstance(v, (date, time)) else v for v in values]
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None):
+    """
+    Devuelve los valores guardados en el cursor o None si viene vacío o adulterado.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+
+
+def valores_cursor(model, order_by, cursor: str | None):
+    """
+    Valores del cursor convertidos al tipo de cada campo de `order_by` (to_python + validadores),
+    o None si viene vacío, adulterado o no calza con el orden: en ese caso se sirve la primera página.
+    """
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(order_by):
+        return None
+    convertidos = []
+    for field, value in zip(order_by, values):
+        name = field.lstrip('-')
+        campo = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        try:
+            value = campo.to_python(value)
+            if value is None:
+                return None
+            campo.run_validators(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        convertidos.append(value)
+    return convertidos
+
+
+def _after(order_by, values) -> Q:
+    """
+    Condición "fila posterior a `values`" para un orden lexicográfico, p. ej. ('-fecha', '-id'):
+    (fecha < v0) OR (fecha = v0 AND id < v1).
+    """
+    condicion = Q()
+    iguales = {}
+    for field, value in zip(order_by, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{name}__{lookup}': value})
+        iguales[name] = value
+    return condicion
+
+
+def keyset_page(qs, order_by: tuple, cursor: str | None, size: int):
+    """
+    Página de `qs` ordenada por `order_by` (el último campo debe ser único, normalmente 'id')
+    que empieza después de `cursor`. El costo no depende de la profundidad: usa WHERE por clave,
+    no OFFSET. Devuelve (items, next_cursor); next_cursor es None en la última página.
+    """
+    qs = qs.order_by(*order_by)
+    values = valores_cursor(qs.model, order_by, cursor)
+    if values is not None:
+        qs = qs.filter(_after(order_by, values))
+
+    items = list(qs[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, f.lstrip('-')) for f in order_by])
+    return items, next_cursor
+
+
+ADMIN_PAGE_SIZE = 50
+
+
+def _invertir(order_by) -> tuple:
+    return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in order_by)
+
+
+def _admite_keyset(model, order_by) -> bool:
+    """
+    Keyset solo con columnas propias y no nulas (con NULL o campos de otra tabla se usa OFFSET).
+    """
+    for field in order_by:
+        name = field.lstrip('-')
+        if '__' in name:
+            return False
+        if name != 'pk' and model._meta.get_field(name).null:
+            return False
+    return True
+
+
+class PaginaAdmin:
+    """
+    Página de un listado del panel: `items`, totales del filtro completo (`totales`, calculados en
+    un único aggregate) y URLs de la página anterior/siguiente que conservan el resto del querystring.
+    """
+
+    def __init__(self, request, items, totales, siguiente=None, anterior=None):
+        self.items = items
+        self.totales = totales
+        self.total_filas = totales['total_filas']
+        self.url_siguiente = self._url(request, siguiente)
+        self.url_anterior = self._url(request, anterior)
+
+    @staticmethod
+    def _url(request, params):
+        if params is None:
+            return None
+        query = request.GET.copy()
+        for key in ('cursor', 'antes', 'pagina'):
+            query.pop(key, None)
+        query.update(params)
+        return f'?{query.urlencode()}'
+
+
+def paginar_admin(request, qs, order_by: tuple, campos=None, agregados=None, size: int = ADMIN_PAGE_SIZE) -> PaginaAdmin:
+    """
+    Pagina `qs` para un listado del panel.
+    - Proyección: con `campos` solo se cargan esas columnas (only()), más las del orden.
+    - Totales: COUNT y los `agregados` extra ({'alias': Sum(...)}) en una sola consulta.
+    - Orden estable: `order_by` debe terminar en un campo único (normalmente 'id').
+    - Keyset (?cursor= / ?antes=) cuando el orden lo admite; si no, OFFSET con ?pagina=.
+    """
+    totales = qs.aggregate(total_filas=Count('pk'), **(agregados or {}))
+    if campos:
+        qs = qs.only(*campos, *[f.lstrip('-') for f in order_by if '__' not in f])
+
+    if not _admite_keyset(qs.model, order_by):
+        try:
+            pagina = max(1, int(request.GET.get('pagina') or 1))
+        except ValueError:
+            pagina = 1
+        inicio = (pagina - 1) * size
+        items = list(qs.order_by(*order_by)[inicio:inicio + size + 1])
+        siguiente = {'pagina': pagina + 1} if len(items) > size else None
+        anterior = {'pagina': pagina - 1} if pagina > 1 else None
+        return PaginaAdmin(request, items[:size], totales, siguiente, anterior)
+
+    def valores(obj):
+        return encode_cursor([getattr(obj, f.lstrip('-')) for f in order_by])
+
+    # un cursor adulterado (tipos que no calzan con el orden) se ignora y se sirve la primera página
+    antes = valores_cursor(qs.model, order_by, request.GET.get('antes'))
+    if antes is not None:
+        # hacia atrás: orden invertido desde el cursor y se da vuelta el resultado
+        invertido = _invertir(order_by)
+        items = list(qs.order_by(*invertido).filter(_after(invertido, antes))[:size + 1])
+        hay_anterior = len(items) > size
+        items = list(reversed(items[:size]))
+        if not items:
+            return PaginaAdmin(request, items, totales)
+        anterior = {'antes': valores(items[0])} if hay_anterior else None
+        return PaginaAdmin(request, items, totales, {'cursor': valores(items[-1])}, anterior)
+
+    cursor = request.GET.get('cursor')
+    items, next_cursor = keyset_page(qs, order_by, cursor, size)
+    siguiente = {'cursor': next_cursor} if next_cursor else None
+    desde_cursor = valores_cursor(qs.model, order_by, cursor) is not None
+    anterior = {'antes': valores(items[0])} if desde_cursor and items else None
+    return PaginaAdmin(request, items, totales, siguiente, anterior)
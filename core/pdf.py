@@ -0,0 +1,101 @@
+PAGE_WIDTH = 595   # A4 en puntos
+PAGE_HEIGHT = 842
+MARGIN_TOP = 780
+MARGIN_BOTTOM = 60
+LEADING = 14        # separación entre líneas de 10 pt
+# súbela al cambiar cómo se dibuja el documento: entra en el ETag y la clave de caché de las boletas
+VERSION_RENDERER = 2
+
+
+def pdf_texto(texto: str) -> bytes:
+    """
+    Cadena literal PDF en cp1252 (WinAnsiEncoding de la fuente) con \\, ( y ) escapados.
+    """
+    raw = str(texto).encode('cp1252', 'replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class PdfWriter:
+    """
+    Escritor de PDF mínimo, sin dependencias: escribe cada objeto directamente en `out`
+    (archivo o BytesIO) y registra su offset al escribirlo, así la tabla xref sale al final
+    sin releer nada. Uso: reservar() números de objeto, escribir con objeto()/stream() en
+    cualquier orden y terminar con cerrar(root).
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.pos = 0
+        self.offsets = {}
+        self._siguiente = 1
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data: bytes) -> None:
+        self.out.write(data)
+        self.pos += len(data)
+
+    def reservar(self) -> int:
+        num = self._siguiente
+        self._siguiente += 1
+        return num
+
+    def objeto(self, num: int, cuerpo: bytes) -> None:
+        self.offsets[num] = self.pos
+        self._write(b'%d 0 obj\n' % num)
+        self._write(cuerpo)
+        self._write(b'\nendobj\n')
+
+    def stream(self, num: int, data: bytes) -> None:
+        self.objeto(num, b'<< /Length %d >>\nstream\n' % len(data) + data + b'\nendstream')
+
+    def cerrar(self, root: int) -> None:
+        inicio_xref = self.pos
+        total = self._siguiente
+        partes = [b'xref\n0 %d\n0000000000 65535 f \n' % total]
+        partes.extend(b'%010d 00000 n \n' % self.offsets[num] for num in range(1, total))
+        partes.append(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (total, root, inicio_xref))
+        self._write(b''.join(partes))
+
+
+def lineas_por_pagina() -> int:
+    # la primera línea de cada página es el título (12 pt)
+    return (MARGIN_TOP - MARGIN_BOTTOM) // LEADING - 1
+
+
+def escribir_documento(out, title: str, lines: list[str]) -> None:
+    """
+    Escribe en `out` un documento de texto paginado: el título se repite en cada página y
+    el pie indica "Página i de n". Todas las páginas comparten un único objeto de fuente.
+    """
+    por_pagina = lineas_por_pagina()
+    paginas = [lines[i:i + por_pagina] for i in range(0, len(lines), por_pagina)] or [[]]
+
+    pdf = PdfWriter(out)
+    catalogo = pdf.reservar()
+    raiz_paginas = pdf.reservar()
+    fuente = pdf.reservar()
+    pdf.objeto(fuente, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    titulo = pdf_texto(title)
+    kids = []
+    for numero, contenido in enumerate(paginas, start=1):
+        ops = [b'BT', b'/F1 12 Tf', b'50 %d Td' % MARGIN_TOP, titulo + b' Tj', b'/F1 10 Tf', b'%d TL' % LEADING]
+        ops.extend(b'T* ' + pdf_texto(line) + b' Tj' for line in contenido)
+        ops.extend([b'ET', b'BT', b'/F1 8 Tf', b'50 %d Td' % (MARGIN_BOTTOM - 20)])
+        ops.append(pdf_texto(f'Página {numero} de {len(paginas)}') + b' Tj')
+        ops.append(b'ET')
+
+        stream = pdf.reservar()
+        pdf.stream(stream, b'\n'.join(ops))
+        pagina = pdf.reservar()
+        pdf.objeto(pagina, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 %d 0 R >> >> >>'
+        ) % (raiz_paginas, PAGE_WIDTH, PAGE_HEIGHT, stream, fuente))
+        kids.append(pagina)
+
+    pdf.objeto(raiz_paginas, b'<< /Type /Pages /Count %d /Kids [%s] >>' % (
+        len(kids), b' '.join(b'%d 0 R' % k for k in kids),
+    ))
+    pdf.objeto(catalogo, b'<< /Type /Catalog /Pages %d 0 R >>' % raiz_paginas)
+    pdf.cerrar(catalogo)
@@ -0,0 +1,92 @@
+from django.db import transaction
+
+from .models import DetallePedido, HistorialCliente, Pedido
+from .tareas import avanzar
+from .ventas import dia_local, registrar_cambios
+
+
+ESTADOS_CERRADOS = ('rechazado', 'finalizado')
+MOTIVO_DESCONTINUADO = 'Producto descontinuado.'
+# con más pedidos abiertos que esto la cascada de un producto descontinuado va en segundo plano
+CASCADA_SINCRONA_MAX = 500
+TRAMO_CASCADA = 500  # pedidos por transacción en segundo plano
+# acción masiva del listado: estado destino -> estados desde los que se puede llegar
+TRANSICIONES = {
+    'pendiente': ('en_proceso',),
+    'en_proceso': ('pendiente',),
+    'finalizado': ('pendiente', 'en_proceso'),
+    'rechazado': ('pendiente', 'en_proceso'),
+}
+LOTE_MAXIMO = 1000  # pedidos por acción masiva
+
+
+def transicionar(qs, estado: str, motivo: str = '', accion: str = 'Pedido {id} -> {estado}', tramo=None) -> list:
+    """
+    Pasa a `estado` los pedidos de `qs` que aún no lo tienen, en una transacción: una lectura de
+    las columnas necesarias, un UPDATE por id, un bulk_create del historial y el ajuste del
+    resumen diario de ventas (el UPDATE no pasa por las señales). `accion` se formatea con
+    {id} y {estado}. Con `tramo` solo procesa los primeros `tramo` pedidos por id.
+    Devuelve los ids de los pedidos que cambió.
+    """
+    with transaction.atomic():
+        filas = list(
+            qs.exclude(estado=estado)
+            .order_by('id')
+            .values_list('id', 'estado', 'fecha', 'total', 'cliente_id', 'nombre_cliente', 'correo')[:tramo]
+        )
+        if not filas:
+            return []
+        ids = [f[0] for f in filas]
+        Pedido.objects.filter(id__in=ids).update(estado=estado, motivo_rechazo=motivo)
+        HistorialCliente.objects.bulk_create([
+            HistorialCliente(
+                cliente_id=cliente_id, nombre=nombre, correo=correo,
+                accion=accion.format(id=pk, estado=estado),
+            )
+            for pk, _, _, _, cliente_id, nombre, correo in filas
+        ])
+        registrar_cambios('pedido', [
+            ((dia_local(fecha), anterior, total), (dia_local(fecha), estado, total))
+            for _, anterior, fecha, total, _, _, _ in filas
+        ])
+    return ids
+
+
+def transicionar_lote(ids, estado: str, motivo: str = '') -> list:
+    """
+    Acción masiva: pasa a `estado` los pedidos de `ids` cuyo estado actual lo permite según
+    TRANSICIONES; el resto queda igual. Devuelve los ids que cambió.
+    """
+    if estado not in TRANSICIONES:
+        raise ValueError(f'Estado de pedido desconocido: {estado}')
+    if estado == 'rechazado':
+        motivo = motivo or 'Sin motivo especificado'
+    else:
+        motivo = ''
+    return transicionar(Pedido.objects.filter(id__in=ids, estado__in=TRANSICIONES[estado]), estado, motivo)
+
+
+def pedidos_abiertos_con(producto_id: int):
+    return Pedido.objects.filter(
+        id__in=DetallePedido.objects.filter(producto_id=producto_id).values('pedido_id'),
+    ).exclude(estado__in=ESTADOS_CERRADOS)
+
+
+def rechazar_por_descontinuado(producto_id: int, tramo=None) -> int:
+    return len(transicionar(
+        pedidos_abiertos_con(producto_id), 'rechazado', MOTIVO_DESCONTINUADO,
+        accion='Pedido {id} -> rechazado por producto descontinuado', tramo=tramo,
+    ))
+
+
+def tarea_descontinuar(tarea) -> None:
+    """
+    Tarea 'descontinuar_producto': rechaza por tramos cortos (el lock de escritura se suelta
+    entre uno y otro). Es reanudable: cada tramo toma los pedidos que siguen abiertos.
+    """
+    producto_id = tarea.parametros['producto_id']
+    while True:
+        hechos = rechazar_por_descontinuado(producto_id, tramo=TRAMO_CASCADA)
+        if not hechos:
+            return
+        avanzar(tarea, hechos)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+
+
+def ttl_reserva() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 600))
+
+
+def clave_reserva(request) -> str | None:
+    """
+    Identifica al comprador: usuario autenticado o, si no, la sesión (si existe).
+    """
+    if request.user.is_authenticated:
+        return f'u:{request.user.pk}'
+    if request.session.session_key:
+        return f's:{request.session.session_key}'
+    return None
+
+
+def _reservas_activas(clave, now):
+    qs = ReservaStock.objects.filter(expira__gt=now)
+    if clave:
+        qs = qs.exclude(clave=clave)
+    return qs
+
+
+def reservado_agregado(clave=None, now=None):
+    """
+    Sum() de las reservas activas de otros compradores, para annotate() sobre Producto (un solo JOIN).
+    """
+    now = now or timezone.now()
+    filtro = Q(reservas__expira__gt=now)
+    if clave:
+        filtro &= ~Q(reservas__clave=clave)
+    return Coalesce(Sum('reservas__cantidad', filter=filtro), Value(0), output_field=IntegerField())
+
+
+def reservado_subquery(clave=None, now=None):
+    """
+    Igual que reservado_agregado pero como subconsulta correlacionada (usable en filter()/update()).
+    """
+    now = now or timezone.now()
+    suma = (
+        _reservas_activas(clave, now)
+        .filter(producto=OuterRef('pk'))
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    return Coalesce(Subquery(suma, output_field=IntegerField()), Value(0), output_field=IntegerField())
+
+
+def reservar_carrito(clave: str, cantidades: dict) -> list:
+    """
+    Reemplaza las reservas de `clave` por las del carrito actual (cantidades: {producto_id: n}).
+    Todo o nada: si alguna línea no tiene stock disponible (stock - reservas ajenas activas) no
+    se reserva ninguna, y se devuelven las que no alcanzaron como (nombre, disponible, solicitado).
+    """
+    now = timezone.now()
+    expira = now + ttl_reserva()
+    with transaction.atomic():
+        # la escritura primero: en SQLite toma el lock de escritura antes de leer disponibilidad
+        ReservaStock.objects.filter(clave=clave).delete()
+        productos = (
+            Producto.objects
+            .filter(id__in=list(cantidades), activo=True)
+            .annotate(reservado=reservado_agregado(clave, now))
+            .only('id', 'nombre', 'stock')
+            .in_bulk()
+        )
+        faltantes = []
+        reservas = []
+        for pid, cantidad in cantidades.items():
+            prod = productos.get(pid)
+            if prod is None:
+                continue
+            disponible = max(0, prod.stock - prod.reservado)
+            if disponible < cantidad:
+                faltantes.append((prod.nombre, disponible, cantidad))
+                continue
+            reservas.append(ReservaStock(producto_id=pid, clave=clave, cantidad=cantidad, expira=expira))
+        if not faltantes:
+            ReservaStock.objects.bulk_create(reservas)
+    return faltantes
+
+
+def liberar_reservas(clave: str | None, producto_id=None) -> None:
+    if not clave:
+        return
+    qs = ReservaStock.objects.filter(clave=clave)
+    if producto_id is not None:
+        qs = qs.filter(producto_id=producto_id)
+    qs.delete()
+
+
+def liberar_vencidas(now=None) -> int:
+    """
+    Elimina en un solo DELETE todas las reservas vencidas. Devuelve cuántas se eliminaron.
+    """
+    deleted, _ = ReservaStock.objects.filter(expira__lte=now or timezone.now()).delete()
+    return deleted
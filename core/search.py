@@ -0,0 +1,69 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+
+FTS_TABLE = 'core_producto_fts'
+# el ranking se aplica con un CASE por id; se cuenta después de los filtros del catálogo (activo, categoría)
+FTS_MAX_RESULTS = 240
+# pesos bm25 por columna: nombre, descripcion, categoria
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+REBUILD_SQL = [
+    f'DELETE FROM {FTS_TABLE}',
+    f"""INSERT INTO {FTS_TABLE}(rowid, nombre, descripcion, categoria)
+        SELECT p.id, p.nombre, p.descripcion, COALESCE(c.nombre, '')
+        FROM core_producto p LEFT JOIN core_categoria c ON c.id = p.categoria_id""",
+]
+
+
+def fts_disponible() -> bool:
+    return connection.vendor == 'sqlite'
+
+
+def reconstruir_indice() -> int:
+    """
+    Vuelve a poblar la tabla FTS desde core_producto. Devuelve la cantidad de filas indexadas.
+    """
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _match_expr(query: str) -> str:
+    """
+    Convierte el texto del buscador en una expresión FTS5 segura: cada palabra entre comillas
+    (sin operadores del usuario) y con prefijo, combinadas con AND implícito.
+    """
+    terms = re.findall(r'\w+', query)
+    return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def buscar_productos(qs, query: str):
+    """
+    Filtra `qs` (Producto) por `query` ordenando por relevancia bm25.
+    Los filtros de `qs` van dentro de la consulta FTS, antes del LIMIT: los productos
+    inactivos o de otra categoría no ocupan cupo de FTS_MAX_RESULTS.
+    Fuera de SQLite cae al icontains sobre nombre y descripción.
+    """
+    if not fts_disponible():
+        return qs.filter(Q(nombre__icontains=query) | Q(descripcion__icontains=query))
+
+    expr = _match_expr(query)
+    if not expr:
+        return qs.none()
+    filtro_sql, filtro_params = qs.order_by().values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND +rowid IN ({filtro_sql}) '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s',
+            [expr, *filtro_params, *BM25_WEIGHTS, FTS_MAX_RESULTS],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return qs.none()
+    ranking = Case(*[When(id=pid, then=pos) for pos, pid in enumerate(ids)], output_field=IntegerField())
+    return qs.filter(id__in=ids).order_by(ranking)
@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .banner import invalidar_banner
+from .low_stock import invalidar_low_stock
+from .models import BannerImagen, Pedido, Producto, SolicitudConfeccion
+from .ventas import ORIGEN_POR_MODELO, foto_guardada, foto_venta, registrar_cambios
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_cambiado(sender, update_fields=None, **kwargs):
+    invalidar_low_stock()
+    # el banner solo usa fotos de productos como respaldo; ignora guardados que no tocan la imagen
+    if update_fields is None or 'imagen' in update_fields or 'activo' in update_fields:
+        invalidar_banner()
+
+
+@receiver(post_save, sender=BannerImagen)
+@receiver(post_delete, sender=BannerImagen)
+def banner_cambiado(sender, **kwargs):
+    invalidar_banner()
+
+
+# Resumen diario de ventas: cada instancia recuerda cómo estaba al cargarse y al guardarse
+# o borrarse se aplica la diferencia. Los QuerySet.update() masivos no pasan por aquí y
+# deben llamar a core.ventas.registrar_cambios por su cuenta.
+
+@receiver(post_init, sender=Pedido)
+@receiver(post_init, sender=SolicitudConfeccion)
+def venta_cargada(sender, instance, **kwargs):
+    instance._venta_original = foto_venta(ORIGEN_POR_MODELO[sender], instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=Pedido)
+@receiver(pre_save, sender=SolicitudConfeccion)
+@receiver(pre_delete, sender=Pedido)
+@receiver(pre_delete, sender=SolicitudConfeccion)
+def venta_por_cambiar(sender, instance, **kwargs):
+    # cargada con only() o creada a mano con pk: se lee la fila guardada
+    if instance._venta_original is None and instance.pk and not instance._state.adding:
+        instance._venta_original = foto_guardada(ORIGEN_POR_MODELO[sender], instance.pk)
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=SolicitudConfeccion)
+def venta_guardada(sender, instance, **kwargs):
+    origen = ORIGEN_POR_MODELO[sender]
+    despues = foto_venta(origen, instance)
+    if despues is None:
+        # guardado con update_fields sobre una instancia diferida
+        despues = foto_guardada(origen, instance.pk)
+    registrar_cambios(origen, [(instance._venta_original, despues)])
+    instance._venta_original = despues
+
+
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=SolicitudConfeccion)
+def venta_borrada(sender, instance, **kwargs):
+    registrar_cambios(ORIGEN_POR_MODELO[sender], [(instance._venta_original, None)])
+    instance._venta_original = None
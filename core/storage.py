@@ -0,0 +1,78 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+# nombre de archivo direccionado por contenido: <sha256[:32]>.<ext> (o <hash>_<ancho>.<ext> en miniaturas)
+NOMBRE_INMUTABLE = re.compile(r'^[0-9a-f]{32}(_\d+)?\.[a-z0-9]+$')
+
+
+def hash_contenido(content) -> str:
+    """
+    sha256 (32 hex, igual que thumbnails.hash_archivo) de un File de Django, sin cargarlo entero en memoria.
+    """
+    h = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        h.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return h.hexdigest()[:32]
+
+
+def es_inmutable(name: str) -> bool:
+    return bool(NOMBRE_INMUTABLE.match(posixpath.basename(name)))
+
+
+@deconstructible
+class ContenidoStorage(FileSystemStorage):
+    """
+    Guarda cada archivo como <carpeta>/<hash del contenido>.<ext>. Bytes idénticos se guardan una
+    sola vez: si el archivo ya existe no se vuelve a escribir y todas las filas comparten el nombre.
+    Por eso un archivo nunca cambia de contenido y se puede servir con caché inmutable.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        _, ext = posixpath.splitext(name)
+        name = posixpath.join(posixpath.dirname(name), hash_contenido(content) + ext.lower())
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # mismo nombre = mismo contenido: nunca se agregan sufijos aleatorios
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # escritura atómica: dos subidas simultáneas del mismo archivo escriben los mismos bytes
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks():
+                    fh.write(chunk)
+            os.chmod(tmp, self.file_permissions_mode or 0o644)
+            os.replace(tmp, full_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return name
+
+
+contenido_storage = ContenidoStorage()
@@ -0,0 +1,69 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarea
+
+
+# tipo -> función que recibe la Tarea; debe ser reanudable (se reintenta si se interrumpe)
+TAREAS = {
+    'descontinuar_producto': 'core.pedidos.tarea_descontinuar',
+    'archivar_boletas': 'core.boletas.tarea_archivar_boletas',
+}
+INACTIVIDAD_REINTENTO = timedelta(minutes=5)  # en_curso sin avance por más tiempo = interrumpida
+
+
+def encolar(tipo: str, total: int = 0, **parametros) -> Tarea:
+    """
+    Registra la tarea y, al confirmar la transacción, la lanza en un hilo del proceso actual
+    (salvo TAREAS_EN_HILO = False: entonces queda para `manage.py procesar_tareas`).
+    """
+    if tipo not in TAREAS:
+        raise ValueError(f'Tipo de tarea desconocido: {tipo}')
+    tarea = Tarea.objects.create(tipo=tipo, total=total, parametros=parametros)
+    if getattr(settings, 'TAREAS_EN_HILO', True):
+        transaction.on_commit(lambda: threading.Thread(target=_en_hilo, args=(tarea.pk,), daemon=True).start())
+    return tarea
+
+
+def _en_hilo(tarea_id: int) -> None:
+    try:
+        ejecutar(tarea_id)
+    finally:
+        connection.close()  # la conexión es del hilo
+
+
+def ejecutar(tarea_id: int, reintentar: bool = False) -> bool:
+    """
+    Toma la tarea (pendiente, o también interrumpida con `reintentar`) y la corre hasta terminar.
+    Devuelve False si otro proceso ya la había tomado o no existe.
+    """
+    close_old_connections()
+    disponibles = por_ejecutar() if reintentar else Tarea.objects.filter(estado='pendiente')
+    if not disponibles.filter(pk=tarea_id).update(estado='en_curso', actualizada=timezone.now()):
+        return False
+    tarea = Tarea.objects.get(pk=tarea_id)
+    try:
+        import_string(TAREAS[tarea.tipo])(tarea)
+    except Exception as exc:
+        Tarea.objects.filter(pk=tarea_id).update(estado='fallida', error=repr(exc), actualizada=timezone.now())
+        raise
+    Tarea.objects.filter(pk=tarea_id).update(estado='terminada', actualizada=timezone.now())
+    return True
+
+
+def avanzar(tarea: Tarea, cantidad: int) -> None:
+    Tarea.objects.filter(pk=tarea.pk).update(procesados=F('procesados') + cantidad, actualizada=timezone.now())
+
+
+def por_ejecutar():
+    """
+    Pendientes, y en_curso sin avance en INACTIVIDAD_REINTENTO (el proceso que las corría terminó).
+    """
+    limite = timezone.now() - INACTIVIDAD_REINTENTO
+    return Tarea.objects.filter(Q(estado='pendiente') | Q(estado='en_curso', actualizada__lt=limite))
@@ -0,0 +1,21 @@
+from django import template
+
+from core.thumbnails import srcset, thumb_url
+
+register = template.Library()
+
+
+@register.filter
+def thumb_srcset(digest, ext='jpg'):
+    """
+    srcset con todos los anchos de miniatura: {{ p.imagen_hash|thumb_srcset:'webp' }}
+    """
+    return srcset(digest, ext) if digest else ''
+
+
+@register.filter
+def thumb(digest, width=480):
+    """
+    URL JPEG de un ancho concreto: {{ p.imagen_hash|thumb:480 }}
+    """
+    return thumb_url(digest, int(width)) if digest else ''
@@ -1,3 +1,827 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .banner import imagenes_banner
+from .boletas import render_boleta_pdf
+from .cart import PedidoDuplicado, StockInsuficiente, cotizar_carrito, registrar_pedido
+from .historial import ultimas_acciones
+from .low_stock import low_stock_products
+from .models import (
+    AdminUser, Categoria, Cliente, HistorialCliente, Pedido, Producto, ReservaStock, SolicitudConfeccion, Tarea,
+)
+from .pedidos import MOTIVO_DESCONTINUADO
+from .pdf import VERSION_RENDERER, escribir_documento, lineas_por_pagina
+from .reservas import liberar_vencidas, reservar_carrito
+from .search import FTS_MAX_RESULTS, buscar_productos
+from .tareas import avanzar, ejecutar, encolar, por_ejecutar
+from .ventas import totales_ventas
+
+
+def iniciar_sesion_admin(client):
+    admin = AdminUser.objects.create(username='admin')
+    admin.set_password('clave')
+    admin.save()
+    session = client.session
+    session['admin_id'] = admin.id
+    session.save()
+    return admin
+
+
+def guardar_carrito(client, carrito):
+    session = client.session
+    session['carrito'] = carrito
+    session.save()
+
+
+def cursor_crudo(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+class CarritoTests(TestCase):
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio=Decimal('10'), stock=5)
+            for i in range(60)
+        ]
+
+    def test_consultas_del_carrito_no_dependen_de_la_cantidad_de_productos(self):
+        guardar_carrito(self.client, {str(p.id): 1 for p in self.productos[:2]})
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get('/carrito/')
+        guardar_carrito(self.client, {str(p.id): 1 for p in self.productos})
+        with CaptureQueriesContext(connection) as muchos:
+            respuesta = self.client.get('/carrito/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(pocos), len(muchos))
+
+    def test_resumen_cuenta_todos_los_productos(self):
+        guardar_carrito(self.client, {str(p.id): 1 for p in self.productos})
+        respuesta = self.client.get('/carrito/resumen/')
+        self.assertEqual(respuesta.json()['count'], 60)
+
+
+class ReservaStockTests(TestCase):
+    def setUp(self):
+        self.polera = Producto.objects.create(nombre='Polera', precio=Decimal('10'), stock=3)
+        self.gorro = Producto.objects.create(nombre='Gorro', precio=Decimal('5'), stock=1)
+        self.cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+
+    def test_reserva_todo_o_nada(self):
+        faltantes = reservar_carrito('u:1', {self.polera.id: 2, self.gorro.id: 2})
+        self.assertEqual(faltantes, [('Gorro', 1, 2)])
+        self.assertFalse(ReservaStock.objects.exists())
+
+        self.assertEqual(reservar_carrito('u:1', {self.polera.id: 2, self.gorro.id: 1}), [])
+        self.assertEqual(ReservaStock.objects.filter(clave='u:1').count(), 2)
+
+    def test_reservar_de_nuevo_reemplaza_las_reservas_propias(self):
+        reservar_carrito('u:1', {self.polera.id: 3})
+        self.assertEqual(reservar_carrito('u:1', {self.polera.id: 1}), [])
+        self.assertEqual(list(ReservaStock.objects.values_list('cantidad', flat=True)), [1])
+
+    def test_reservas_ajenas_descuentan_el_disponible(self):
+        reservar_carrito('u:1', {self.polera.id: 2})
+
+        ajeno = cotizar_carrito({str(self.polera.id): 2}, clave='u:2')
+        self.assertEqual(ajeno.lineas[0]['stock'], 1)
+        self.assertFalse(ajeno.lineas[0]['stock_ok'])
+        self.assertEqual(reservar_carrito('u:2', {self.polera.id: 2}), [('Polera', 1, 2)])
+
+        propio = cotizar_carrito({str(self.polera.id): 2}, clave='u:1')
+        self.assertEqual(propio.lineas[0]['stock'], 3)
+
+    @override_settings(STOCK_HOLD_TTL=60)
+    def test_reserva_vencida_deja_de_contar(self):
+        ahora = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=ahora):
+            reservar_carrito('u:1', {self.polera.id: 3})
+        self.assertEqual(ReservaStock.objects.get().expira, ahora + timedelta(seconds=60))
+
+        despues = ahora + timedelta(seconds=61)
+        with mock.patch('django.utils.timezone.now', return_value=despues):
+            self.assertEqual(cotizar_carrito({str(self.polera.id): 3}, clave='u:2').lineas[0]['stock'], 3)
+            self.assertEqual(liberar_vencidas(), 1)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_registrar_pedido_consume_las_reservas_del_comprador(self):
+        clave = f'u:{self.cliente.pk}'
+        reservar_carrito(clave, {self.polera.id: 2})
+        reservar_carrito('u:otro', {self.polera.id: 1})
+
+        registrar_pedido(self.cliente, {str(self.polera.id): 2}, clave=clave)
+
+        self.polera.refresh_from_db()
+        self.assertEqual(self.polera.stock, 1)
+        self.assertEqual(list(ReservaStock.objects.values_list('clave', flat=True)), ['u:otro'])
+        with self.assertRaises(StockInsuficiente):
+            registrar_pedido(self.cliente, {str(self.polera.id): 1}, clave=clave)
+
+
+class IdempotenciaPedidoTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Polera', precio=Decimal('5'), stock=3)
+        self.cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        self.client.force_login(self.cliente)
+        guardar_carrito(self.client, {str(self.producto.id): 1})
+
+    def test_reenvio_con_el_mismo_token_no_descuenta_stock_dos_veces(self):
+        respuesta = self.client.get('/pedido/confirmar/')
+        token = re.search(rb'name="idempotency_key" value="([^"]+)"', respuesta.content).group(1).decode()
+
+        self.client.post('/pedido/confirmar/', {'idempotency_key': token})
+        respuesta = self.client.post('/pedido/confirmar/', {'idempotency_key': token})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 2)
+
+        with self.assertRaises(PedidoDuplicado):
+            registrar_pedido(self.cliente, {str(self.producto.id): 1}, token=token)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 2)
+
+
+class StockBajoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pocas = Producto.objects.create(nombre='Pocas', precio=Decimal('10'), stock=2)
+        self.medio = Producto.objects.create(nombre='Medio', precio=Decimal('10'), stock=10)
+        Producto.objects.create(nombre='Muchas', precio=Decimal('10'), stock=30)
+
+    def ids(self, umbral):
+        return [p['id'] for p in low_stock_products(umbral)]
+
+    def test_indice_en_cache_sirve_cualquier_umbral(self):
+        self.assertEqual(self.ids(5), [self.pocas.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(5), [self.pocas.id])
+            self.assertEqual(self.ids(20), [self.pocas.id, self.medio.id])
+
+    def test_guardar_un_producto_invalida_el_indice(self):
+        self.assertEqual(self.ids(5), [self.pocas.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medio.stock = 1
+            self.medio.save()
+        self.assertEqual(self.ids(5), [self.medio.id, self.pocas.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pocas.activo = False
+            self.pocas.save()
+        self.assertEqual(self.ids(5), [self.medio.id])
+
+
+class BusquedaProductosTests(TestCase):
+    def setUp(self):
+        self.poleras = Categoria.objects.create(nombre='Poleras')
+        self.en_nombre = Producto.objects.create(nombre='Polera bordada', precio=Decimal('10'), stock=5)
+        self.en_descripcion = Producto.objects.create(
+            nombre='Camisa', descripcion='Con cuello bordado a mano', precio=Decimal('10'), stock=5,
+        )
+        self.en_categoria = Producto.objects.create(
+            nombre='Básica', precio=Decimal('10'), stock=5, categoria=self.poleras,
+        )
+
+    def buscar(self, texto, qs=None):
+        return [p.id for p in buscar_productos(qs if qs is not None else Producto.objects.all(), texto)]
+
+    def test_ranking_y_prefijos(self):
+        # "bord" calza por prefijo; el nombre pesa más que la descripción
+        self.assertEqual(self.buscar('bord'), [self.en_nombre.id, self.en_descripcion.id])
+        self.assertEqual(self.buscar('polera'), [self.en_nombre.id, self.en_categoria.id])
+        # comillas u operadores del usuario no llegan crudos a MATCH
+        self.assertEqual(self.buscar('bord"'), [self.en_nombre.id, self.en_descripcion.id])
+        self.assertEqual(self.buscar('***'), [])
+
+    def test_triggers_mantienen_el_indice(self):
+        self.en_nombre.nombre = 'Gorro'
+        self.en_nombre.save()
+        self.assertEqual(self.buscar('gorro'), [self.en_nombre.id])
+        self.assertEqual(self.buscar('bord'), [self.en_descripcion.id])
+
+        self.poleras.nombre = 'Remeras'
+        self.poleras.save()
+        self.assertEqual(self.buscar('remeras'), [self.en_categoria.id])
+
+        self.en_descripcion.delete()
+        self.assertEqual(self.buscar('bord'), [])
+
+    def test_filtros_se_aplican_antes_del_tope(self):
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Polera inactiva {i}', precio=Decimal('10'), stock=5, activo=False)
+            for i in range(FTS_MAX_RESULTS)
+        ])
+        activos = Producto.objects.filter(activo=True)
+        self.assertEqual(self.buscar('polera', activos), [self.en_nombre.id, self.en_categoria.id])
+
+
+class CatalogoPaginadoTests(TestCase):
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio=Decimal('10'), stock=5)
+            for i in range(30)
+        ]
+
+    def test_recorre_el_catalogo_sin_repetir_productos(self):
+        respuesta = self.client.get('/catalogo/')
+        primera = [p.id for p in respuesta.context['productos']]
+        self.assertEqual(primera, [p.id for p in self.productos[:24]])
+
+        respuesta = self.client.get('/catalogo/mas/', {'cursor': respuesta.context['next_cursor']})
+        self.assertEqual([p.id for p in respuesta.context['productos']], [p.id for p in self.productos[24:]])
+        self.assertEqual(respuesta['X-Next-Cursor'], '')
+
+    def test_cursor_adulterado_sirve_la_primera_pagina(self):
+        for valores in ([None], [{'a': 1}], ['x'], [10 ** 30], [1, 2]):
+            with self.subTest(valores=valores):
+                respuesta = self.client.get('/catalogo/', {'cursor': cursor_crudo(valores)})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.context['productos'][0].id, self.productos[0].id)
+        respuesta = self.client.get('/catalogo/', {'cursor': 'no-es-base64!'})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class BoletaEtagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pedido = Pedido.objects.create(
+            nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'), estado='finalizado',
+        )
+        self.url = f'/boleta/pedido/{self.pedido.id}.pdf'
+        iniciar_sesion_admin(self.client)
+
+    def test_304_sin_generar_el_pdf(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF-'))
+        etag = respuesta['ETag']
+
+        with mock.patch('core.boletas.render_boleta_pdf') as render:
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        render.assert_not_called()
+
+        Pedido.objects.filter(id=self.pedido.id).update(total=Decimal('20'))
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_cambio_de_renderer_invalida_etag_y_cache(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with mock.patch('core.boletas.VERSION_RENDERER', VERSION_RENDERER + 1), \
+                mock.patch('core.boletas.render_boleta_pdf', wraps=render_boleta_pdf) as render:
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        render.assert_called_once()
+
+
+class PoolEnLinea:
+    """
+    Reemplazo de ProcessPoolExecutor que ejecuta cada lote al enviarlo y registra cuántos
+    resultados quedaron sin leer a la vez.
+    """
+
+    def __init__(self, max_workers):
+        self.sin_leer = 0
+        self.max_sin_leer = 0
+        PoolEnLinea.ultimo = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        pool = self
+
+        class Futuro(Future):
+            def result(self, timeout=None):
+                pool.sin_leer -= 1
+                return super().result(timeout)
+
+        futuro = Futuro()
+        futuro.set_result(fn(*args))
+        self.sin_leer += 1
+        self.max_sin_leer = max(self.max_sin_leer, self.sin_leer)
+        return futuro
+
+
+class GenerarBoletasTests(TestCase):
+    def setUp(self):
+        self.pedidos = Pedido.objects.bulk_create([
+            Pedido(nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'), estado='finalizado')
+            for _ in range(12)
+        ])
+        Pedido.objects.create(nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'))
+
+    def test_archiva_las_pendientes_con_lotes_en_vuelo_acotados(self):
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(BOLETAS_ROOT=carpeta), \
+                mock.patch('core.management.commands.generar_boletas.ProcessPoolExecutor', PoolEnLinea):
+            call_command('generar_boletas', workers=2, lote=1, stdout=StringIO())
+            self.assertEqual(sorted(os.listdir(carpeta)), sorted(f'pedido_{p.id}.pdf' for p in self.pedidos))
+            self.assertEqual(PoolEnLinea.ultimo.max_sin_leer, 4)
+
+            salida = StringIO()
+            call_command('generar_boletas', workers=2, stdout=salida)
+            self.assertIn('Boletas generadas: 0 (12 ya estaban archivadas)', salida.getvalue())
+
+
+class DocumentoPdfTests(TestCase):
+    def escribir(self, title, lines):
+        buffer = io.BytesIO()
+        escribir_documento(buffer, title, lines)
+        return buffer.getvalue()
+
+    def test_pagina_y_repite_el_titulo(self):
+        por_pagina = lineas_por_pagina()
+        pdf = self.escribir('Boleta (copia)', [f'Línea {i}' for i in range(por_pagina * 2 + 1)])
+
+        self.assertIn(b'/Type /Pages /Count 3 ', pdf)
+        self.assertEqual(pdf.count(b'(Boleta \\(copia\\)) Tj'), 3)
+        self.assertIn('(Página 3 de 3) Tj'.encode('cp1252'), pdf)
+        self.assertEqual(pdf.count(b'/Type /Font'), 1)
+
+    def test_xref_apunta_a_cada_objeto(self):
+        pdf = self.escribir('Boleta', ['Total: 10'])
+        inicio_xref = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        self.assertTrue(pdf[inicio_xref:].startswith(b'xref\n0 '))
+
+        entradas = pdf[inicio_xref:].split(b'\n')[3:]
+        numero = 1
+        for entrada in entradas:
+            if not entrada.endswith(b' n '):
+                break
+            offset = int(entrada.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj\n' % numero))
+            numero += 1
+        self.assertEqual(numero - 1, pdf.count(b' 0 obj\n'))
+
+
+class ZipBoletasTests(TestCase):
+    def setUp(self):
+        self.finalizados = [
+            Pedido.objects.create(
+                nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'), estado='finalizado',
+            )
+            for _ in range(2)
+        ]
+        Pedido.objects.create(nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'))
+        iniciar_sesion_admin(self.client)
+
+    def descargar(self, **filtros):
+        respuesta = self.client.get('/panel/ventas/boletas.zip', filtros)
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content)))
+
+    def test_incluye_solo_las_boletas_y_usa_las_archivadas(self):
+        archivado, generado = self.finalizados
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(BOLETAS_ROOT=carpeta):
+            with open(os.path.join(carpeta, f'pedido_{archivado.id}.pdf'), 'wb') as f:
+                f.write(b'%PDF-archivada')
+            zip_boletas = self.descargar()
+
+        self.assertEqual(zip_boletas.namelist(), [f'pedidos/pedido_{archivado.id}.pdf', f'pedidos/pedido_{generado.id}.pdf'])
+        self.assertEqual(zip_boletas.read(f'pedidos/pedido_{archivado.id}.pdf'), b'%PDF-archivada')
+        self.assertTrue(zip_boletas.read(f'pedidos/pedido_{generado.id}.pdf').startswith(b'%PDF-1.4'))
+        self.assertIsNone(zip_boletas.testzip())
+
+    def test_respeta_el_rango_de_fechas(self):
+        manana = (timezone.localdate() + timedelta(days=1)).isoformat()
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(BOLETAS_ROOT=carpeta):
+            self.assertEqual(self.descargar(desde=manana).namelist(), [])
+
+
+class ExportacionCsvTests(TestCase):
+    def setUp(self):
+        self.finalizado = Pedido.objects.create(
+            nombre_cliente='=HYPERLINK("x")', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'),
+            estado='finalizado',
+        )
+        Pedido.objects.create(nombre_cliente='beto', correo='beto@correo.cl', direccion='Calle 2', total=Decimal('5'))
+        SolicitudConfeccion.objects.create(
+            nombre='Ana', correo='ana@correo.cl', telefono='+56911111111', tipo_prenda='polera', descripcion_diseno='d',
+        )
+        iniciar_sesion_admin(self.client)
+
+    def leer(self, url, **filtros):
+        respuesta = self.client.get(url, filtros)
+        self.assertTrue(respuesta.streaming)
+        texto = b''.join(respuesta.streaming_content).decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff'))
+        return list(csv.reader(StringIO(texto[1:])))
+
+    def test_pedidos_con_los_filtros_del_listado(self):
+        filas = self.leer('/panel/pedidos/exportar.csv', estado='finalizado')
+        self.assertEqual(filas[0], ['id', 'fecha', 'nombre_cliente', 'correo', 'direccion', 'estado', 'total', 'motivo_rechazo'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][0], str(self.finalizado.id))
+        # texto del cliente que Excel tomaría como fórmula
+        self.assertEqual(filas[1][2], '\'=HYPERLINK("x")')
+
+    def test_solicitudes_dejan_los_telefonos_tal_cual(self):
+        filas = self.leer('/panel/solicitudes-confeccion/exportar.csv')
+        self.assertEqual(len(filas), 2)
+        fila = dict(zip(filas[0], filas[1]))
+        self.assertEqual(fila['telefono'], '+56911111111')
+        self.assertEqual(fila['cotizacion_aceptada'], '')
+
+
+class PaginacionPanelTests(TestCase):
+    def setUp(self):
+        # mismo instante para todos: el id desempata el orden ('-fecha', '-id')
+        Pedido.objects.bulk_create([
+            Pedido(nombre_cliente='ana', correo='ana@correo.cl', direccion='Calle 1', total=Decimal('10'))
+            for _ in range(55)
+        ])
+        self.ids = list(Pedido.objects.order_by('-fecha', '-id').values_list('id', flat=True))
+        iniciar_sesion_admin(self.client)
+
+    def ids_de(self, respuesta):
+        return [p.id for p in respuesta.context['pedidos']]
+
+    def test_siguiente_y_anterior(self):
+        respuesta = self.client.get('/panel/pedidos/')
+        self.assertEqual(self.ids_de(respuesta), self.ids[:50])
+        self.assertEqual(respuesta.context['pagina'].total_filas, 55)
+        self.assertIsNone(respuesta.context['pagina'].url_anterior)
+
+        respuesta = self.client.get('/panel/pedidos/' + respuesta.context['pagina'].url_siguiente)
+        self.assertEqual(self.ids_de(respuesta), self.ids[50:])
+        self.assertIsNone(respuesta.context['pagina'].url_siguiente)
+
+        respuesta = self.client.get('/panel/pedidos/' + respuesta.context['pagina'].url_anterior)
+        self.assertEqual(self.ids_de(respuesta), self.ids[:50])
+
+    def test_cursor_adulterado_sirve_la_primera_pagina(self):
+        for parametro in ('cursor', 'antes'):
+            for valores in (['basura', 1], [None, 1], ['2024-01-01T00:00:00+00:00', 'x']):
+                with self.subTest(parametro=parametro, valores=valores):
+                    respuesta = self.client.get('/panel/pedidos/', {parametro: cursor_crudo(valores)})
+                    self.assertEqual(respuesta.status_code, 200)
+                    self.assertEqual(self.ids_de(respuesta), self.ids[:50])
+                    self.assertIsNone(respuesta.context['pagina'].url_anterior)
+
+
+class VentaDiariaTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        self.producto = Producto.objects.create(nombre='Polera', precio=Decimal('1000'), stock=50)
+
+    def verificar_resumen(self):
+        salida = StringIO()
+        call_command('reconstruir_ventas', '--verificar', stdout=salida)
+        self.assertIn('al día', salida.getvalue())
+
+    def test_resumen_sigue_los_cambios_de_los_pedidos(self):
+        pedido = registrar_pedido(self.cliente, {str(self.producto.id): 3})
+        self.assertEqual(totales_ventas('pedido', estado='pendiente'), Decimal('3000'))
+
+        iniciar_sesion_admin(self.client)
+        respuesta = self.client.post(f'/panel/pedidos/{pedido.id}/', {'estado': 'finalizado'})
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(totales_ventas('pedido', estado='pendiente'), 0)
+        self.assertEqual(totales_ventas('pedido', estado='finalizado'), Decimal('3000'))
+
+        # instancia diferida guardada con update_fields
+        diferido = Pedido.objects.only('id').get(id=pedido.id)
+        diferido.estado = 'rechazado'
+        diferido.save(update_fields=['estado'])
+        self.assertEqual(totales_ventas('pedido', estado='rechazado'), Decimal('3000'))
+        self.verificar_resumen()
+
+        Pedido.objects.get(id=pedido.id).delete()
+        self.assertEqual(totales_ventas('pedido'), 0)
+        self.verificar_resumen()
+
+    def test_reconstruir_corrige_cambios_sin_senales(self):
+        registrar_pedido(self.cliente, {str(self.producto.id): 2})
+        Pedido.objects.update(estado='finalizado')
+
+        salida = StringIO()
+        call_command('reconstruir_ventas', '--verificar', stdout=salida)
+        self.assertIn('distintas', salida.getvalue())
+
+        call_command('reconstruir_ventas', stdout=StringIO())
+        self.assertEqual(totales_ventas('pedido', estado='finalizado'), Decimal('2000'))
+        self.verificar_resumen()
+
+
+class HistorialClienteTests(TestCase):
+    def setUp(self):
+        self.ana = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        self.beto = Cliente.objects.create_user(username='beto', email='beto@correo.cl', password='clave')
+        HistorialCliente.objects.bulk_create([
+            HistorialCliente(cliente=self.ana, nombre='ana', correo='ana@correo.cl', accion=f'accion {i}')
+            for i in range(25)
+        ])
+        iniciar_sesion_admin(self.client)
+
+    def test_ultima_accion_por_cliente(self):
+        ultimas = ultimas_acciones([self.ana.id, self.beto.id])
+        self.assertEqual(list(ultimas), [self.ana.id])
+        self.assertEqual(ultimas[self.ana.id].accion, 'accion 24')
+
+    def test_historial_por_tramos(self):
+        respuesta = self.client.get(f'/panel/clientes/{self.ana.id}/historial/')
+        acciones = [h.accion for h in respuesta.context['acciones']]
+        self.assertEqual(acciones, [f'accion {i}' for i in range(24, 4, -1)])
+
+        respuesta = self.client.get(f'/panel/clientes/{self.ana.id}/historial/', {'cursor': respuesta['X-Next-Cursor']})
+        self.assertEqual([h.accion for h in respuesta.context['acciones']], [f'accion {i}' for i in range(4, -1, -1)])
+        self.assertEqual(respuesta['X-Next-Cursor'], '')
+
+    def test_cursor_adulterado_sirve_el_primer_tramo(self):
+        for valores in (['basura', 1], [None, None], [{'a': 1}, 1]):
+            with self.subTest(valores=valores):
+                respuesta = self.client.get(f'/panel/clientes/{self.ana.id}/historial/', {'cursor': cursor_crudo(valores)})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.context['acciones'][0].accion, 'accion 24')
+
+
+class ClienteForaneaTests(TestCase):
+    def setUp(self):
+        self.ana = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        self.beto = Cliente.objects.create_user(username='beto', email='beto@correo.cl', password='clave')
+
+    def nuevo_pedido(self, nombre_cliente, **extra):
+        return Pedido.objects.create(
+            nombre_cliente=nombre_cliente, correo=f'{nombre_cliente}@correo.cl', direccion='Calle 1',
+            total=Decimal('10'), **extra,
+        )
+
+    def test_backfill_enlaza_por_username_vigente_en_la_fecha(self):
+        backfill = import_module('core.migrations.0023_backfill_cliente_fk')
+        propio = self.nuevo_pedido('ana')
+        huerfano = self.nuevo_pedido('borrado')
+        anterior = self.nuevo_pedido('beto')
+        # pedido de una cuenta "beto" anterior, eliminada antes de que se reutilizara el username
+        Pedido.objects.filter(id=anterior.id).update(fecha=self.beto.date_joined - timedelta(days=1))
+        historial = HistorialCliente.objects.create(nombre='ana', correo='ana@correo.cl', accion='bloqueado')
+        sin_cuenta = HistorialCliente.objects.create(nombre='nadie', correo='n@correo.cl', accion='bloqueado')
+
+        with mock.patch.object(backfill, 'TRAMO', 1):
+            backfill.enlazar_clientes(django_apps, None)
+            backfill.enlazar_clientes(django_apps, None)  # volver a correrla no cambia nada
+
+        enlazados = dict(Pedido.objects.values_list('id', 'cliente_id'))
+        self.assertEqual(enlazados, {propio.id: self.ana.id, huerfano.id: None, anterior.id: None})
+        self.assertEqual(HistorialCliente.objects.get(id=historial.id).cliente_id, self.ana.id)
+        self.assertIsNone(HistorialCliente.objects.get(id=sin_cuenta.id).cliente_id)
+
+    def test_solo_el_dueno_ve_sus_pedidos_y_boletas(self):
+        # el nombre guardado es el del momento de la compra; la cuenta dueña es la FK
+        pedido = self.nuevo_pedido('beto', cliente=self.ana, estado='finalizado')
+        url = f'/boleta/pedido/{pedido.id}.pdf'
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.beto)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(list(self.client.get('/mis-pedidos/').context['pedidos']), [])
+
+        self.client.force_login(self.ana)
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(list(self.client.get('/mis-pedidos/').context['pedidos']), [pedido])
+
+
+class CamposRastreadosTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+
+    def test_guardar_escribe_solo_las_columnas_modificadas(self):
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        cliente.bloqueado = True
+        self.assertEqual(cliente.campos_modificados(), ['bloqueado'])
+        with CaptureQueriesContext(connection) as consultas:
+            cliente.save()
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('SET "bloqueado"', consultas[0]['sql'])
+        self.assertNotIn('"username"', consultas[0]['sql'])
+        self.assertEqual(cliente.campos_modificados(), [])
+
+    def test_guardar_sin_cambios_no_consulta(self):
+        cliente = Cliente.objects.get(pk=self.cliente.pk)
+        with self.assertNumQueries(0):
+            cliente.save()
+
+    def test_instancia_diferida_no_pisa_otras_columnas(self):
+        Cliente.objects.filter(pk=self.cliente.pk).update(bloqueado=True)
+        diferido = Cliente.objects.only('id').get(pk=self.cliente.pk)
+        diferido.telefono = '+56922222222'
+        with CaptureQueriesContext(connection) as consultas:
+            diferido.save()
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('SET "telefono"', consultas[0]['sql'])
+        self.cliente.refresh_from_db()
+        self.assertEqual((self.cliente.telefono, self.cliente.bloqueado), ('+56922222222', True))
+
+
+class DescontinuarProductoTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        self.producto = Producto.objects.create(nombre='Polera', precio=Decimal('100'), stock=500)
+        otro = Producto.objects.create(nombre='Gorro', precio=Decimal('50'), stock=500)
+        self.abiertos = [registrar_pedido(cliente, {str(self.producto.id): 1}) for _ in range(3)]
+        Pedido.objects.filter(id=self.abiertos[0].id).update(estado='en_proceso')
+        self.finalizado = registrar_pedido(cliente, {str(self.producto.id): 1})
+        self.ajeno = registrar_pedido(cliente, {str(otro.id): 1})
+        Pedido.objects.filter(id=self.finalizado.id).update(estado='finalizado')
+        call_command('reconstruir_ventas', stdout=StringIO())
+        iniciar_sesion_admin(self.client)
+
+    def estados(self):
+        return dict(Pedido.objects.values_list('id', 'estado'))
+
+    def verificar_rechazo(self):
+        estados = self.estados()
+        self.assertEqual({estados[p.id] for p in self.abiertos}, {'rechazado'})
+        self.assertEqual(estados[self.finalizado.id], 'finalizado')
+        self.assertEqual(estados[self.ajeno.id], 'pendiente')
+        self.assertEqual(
+            set(Pedido.objects.filter(estado='rechazado').values_list('motivo_rechazo', flat=True)),
+            {MOTIVO_DESCONTINUADO},
+        )
+        self.assertEqual(HistorialCliente.objects.filter(accion__endswith='por producto descontinuado').count(), 3)
+        self.assertEqual(totales_ventas('pedido', estado='rechazado'), Decimal('300'))
+        salida = StringIO()
+        call_command('reconstruir_ventas', '--verificar', stdout=salida)
+        self.assertIn('al día', salida.getvalue())
+
+    def test_cascada_sincrona(self):
+        respuesta = self.client.post(f'/panel/productos/eliminar/{self.producto.id}/')
+        self.assertEqual(respuesta['Location'], '/panel/productos/')
+        self.assertFalse(Producto.objects.get(id=self.producto.id).activo)
+        self.verificar_rechazo()
+
+    @override_settings(TAREAS_EN_HILO=False)
+    def test_cascada_en_segundo_plano_por_tramos(self):
+        with mock.patch('core.views.CASCADA_SINCRONA_MAX', 2):
+            respuesta = self.client.post(f'/panel/productos/eliminar/{self.producto.id}/')
+        tarea = Tarea.objects.get()
+        self.assertEqual(respuesta['Location'], f'/panel/productos/?tarea={tarea.id}')
+        self.assertEqual((tarea.tipo, tarea.total, tarea.parametros), ('descontinuar_producto', 3, {'producto_id': self.producto.id}))
+        self.assertEqual(self.estados()[self.abiertos[0].id], 'en_proceso')
+
+        with mock.patch('core.pedidos.TRAMO_CASCADA', 2), mock.patch('core.pedidos.avanzar', wraps=avanzar) as avance:
+            call_command('procesar_tareas', stdout=StringIO())
+        self.assertEqual([c.args[1] for c in avance.call_args_list], [2, 1])
+        self.verificar_rechazo()
+        self.assertEqual(
+            self.client.get(f'/panel/tareas/{tarea.id}/').json(),
+            {'estado': 'terminada', 'total': 3, 'procesados': 3, 'error': ''},
+        )
+        self.assertFalse(ejecutar(tarea.id))
+
+    @override_settings(TAREAS_EN_HILO=False)
+    def test_tarea_interrumpida_se_reanuda(self):
+        tarea = encolar('descontinuar_producto', total=3, producto_id=self.producto.id)
+        Tarea.objects.filter(id=tarea.id).update(estado='en_curso')
+        self.assertNotIn(tarea, por_ejecutar())
+
+        Tarea.objects.filter(id=tarea.id).update(actualizada=timezone.now() - timedelta(hours=1))
+        self.assertIn(tarea, por_ejecutar())
+        self.assertTrue(ejecutar(tarea.id, reintentar=True))
+        self.verificar_rechazo()
+
+
+class CambioEstadoLoteTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create_user(username='ana', email='ana@correo.cl', password='clave')
+        producto = Producto.objects.create(nombre='Polera', precio=Decimal('100'), stock=500)
+        self.pedidos = [registrar_pedido(cliente, {str(producto.id): 1}) for _ in range(6)]
+        self.ids = [str(p.id) for p in self.pedidos]
+        iniciar_sesion_admin(self.client)
+
+    def test_cambia_solo_los_pedidos_con_transicion_valida(self):
+        Pedido.objects.filter(id=self.pedidos[0].id).update(estado='rechazado')
+        call_command('reconstruir_ventas', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post('/panel/pedidos/cambiar-estado/', {
+                'ids': self.ids, 'estado': 'finalizado', 'next': '/panel/pedidos/?estado=todos',
+            })
+        self.assertEqual(respuesta['Location'], '/panel/pedidos/?estado=todos')
+        self.assertLess(len(consultas), 20)
+        self.assertEqual(Pedido.objects.filter(estado='finalizado').count(), 5)
+        self.assertEqual(Pedido.objects.get(id=self.pedidos[0].id).estado, 'rechazado')
+        self.assertEqual(HistorialCliente.objects.filter(accion__endswith='-> finalizado').count(), 5)
+        self.assertEqual(totales_ventas('pedido', estado='finalizado'), Decimal('500'))
+
+        salida = StringIO()
+        call_command('reconstruir_ventas', '--verificar', stdout=salida)
+        self.assertIn('al día', salida.getvalue())
+
+    def test_estado_invalido_no_cambia_nada(self):
+        self.client.post('/panel/pedidos/cambiar-estado/', {'ids': self.ids, 'estado': 'enviado'})
+        self.client.post('/panel/pedidos/cambiar-estado/', {'estado': 'finalizado'})
+        self.assertEqual(Pedido.objects.filter(estado='pendiente').count(), 6)
+
+    def test_next_externo_vuelve_al_listado(self):
+        for next_url in ('https://otro.example/', '//otro.example/panel/', 'javascript:alert(1)'):
+            with self.subTest(next_url=next_url):
+                respuesta = self.client.post('/panel/pedidos/cambiar-estado/', {
+                    'ids': self.ids[:1], 'estado': 'en_proceso', 'next': next_url,
+                })
+                self.assertEqual(respuesta['Location'], '/panel/pedidos/')
+
+    def test_rechazo_sin_motivo_usa_el_motivo_por_defecto(self):
+        self.client.post('/panel/pedidos/cambiar-estado/', {'ids': self.ids[:1], 'estado': 'rechazado'})
+        self.assertEqual(Pedido.objects.get(id=self.pedidos[0].id).motivo_rechazo, 'Sin motivo especificado')
+
+
+class ImportacionProductosTests(TestCase):
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Poleras')
+        self.a = Producto.objects.create(nombre='A', precio=Decimal('1000'), stock=5, categoria=self.categoria)
+        self.b = Producto.objects.create(nombre='B', precio=Decimal('2000'), stock=1)
+        iniciar_sesion_admin(self.client)
+
+    def importar(self, contenido):
+        respuesta = self.client.post('/panel/productos/importar/', {
+            'archivo': SimpleUploadedFile('productos.csv', contenido),
+        })
+        return respuesta.context['resultado']
+
+    def test_exportar_e_importar_sin_cambios(self):
+        respuesta = self.client.get('/panel/productos/exportar.csv')
+        texto = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        self.assertIn(f'{self.a.id},A,,1000.00,5,Poleras,sí', texto)
+
+        resultado = self.importar(texto.encode('utf-8-sig'))
+        self.assertEqual(
+            (resultado.creados, resultado.actualizados, resultado.sin_cambios, resultado.total_errores),
+            (0, 0, 2, 0),
+        )
+
+    def test_filas_invalidas_se_reportan_por_linea_sin_detener_el_resto(self):
+        contenido = (
+            'id;precio;stock;categoria;nombre;activo\r\n'
+            f'{self.a.id};1500;7;poleras;;\r\n'
+            f'{self.b.id};;;;;no\r\n'
+            ';10;3;;Nuevo;\r\n'
+            ';10;3;Gorros;Otro;\r\n'
+            f'{self.a.id};99999999;1;;;\r\n'
+            '999999;1;1;;;\r\n'
+            'x;1;1;;;\r\n'
+            ';NaN;1;;Z;\r\n'
+            ';1;1;;;\r\n'
+        )
+        resultado = self.importar(contenido.encode())
+
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 2))
+        self.assertEqual([linea for linea, _ in resultado.errores], [5, 6, 7, 8, 9, 10])
+        self.assertIn('Gorros', resultado.errores[0][1])
+        self.assertIn('999999', resultado.errores[2][1])
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.precio, self.a.stock, self.a.nombre), (Decimal('1500'), 7, 'A'))
+        self.assertFalse(self.b.activo)
+        self.assertTrue(Producto.objects.get(nombre='Nuevo').activo)
+        self.assertFalse(Producto.objects.filter(nombre='Otro').exists())
+
+    def test_archivo_invalido(self):
+        resultado = self.importar(b'foo,bar\n1,2\n')
+        self.assertEqual(resultado.errores[0][0], 1)
+
+        resultado = self.importar('nombre,precio,stock\nCañón,1,1\n'.encode('latin-1'))
+        self.assertIn('UTF-8', resultado.errores[0][1])
+        self.assertEqual(resultado.creados, 0)
+
+    def test_desactivar_por_importacion_actualiza_banner_y_stock_bajo(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            Producto.objects.filter(id=self.a.id).update(imagen='productos/a.jpg')
+            cache.clear()
+            self.assertEqual(imagenes_banner(), ['/media/productos/a.jpg'])
+            self.assertEqual(len(low_stock_products(5)), 2)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.importar(f'id,activo,stock\n{self.a.id},no,0\n'.encode())
+
+            self.assertEqual(imagenes_banner(), [])
+            self.assertEqual([p['id'] for p in low_stock_products(5)], [self.b.id])
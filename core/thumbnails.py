@@ -0,0 +1,87 @@
+import hashlib
+import os
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+
+THUMB_WIDTHS = (240, 480, 960)
+THUMB_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+THUMB_QUALITY = 80
+THUMB_DIR = 'thumbs'
+
+
+def hash_archivo(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()[:32]
+
+
+def _ruta_relativa(digest: str, width: int, ext: str) -> str:
+    return f'{THUMB_DIR}/{digest[:2]}/{digest}_{width}.{ext}'
+
+
+def thumb_url(digest: str, width: int, ext: str = 'jpg') -> str:
+    return f"{settings.MEDIA_URL.rstrip('/')}/{_ruta_relativa(digest, width, ext)}"
+
+
+def srcset(digest: str, ext: str) -> str:
+    return ', '.join(f'{thumb_url(digest, w, ext)} {w}w' for w in THUMB_WIDTHS)
+
+
+def generar_derivados(path: str, digest: str) -> int:
+    """
+    Genera las miniaturas WebP/JPEG de `path` que aún no existen para `digest`.
+    Como el nombre depende del contenido, cada derivado se genera una sola vez.
+    Devuelve cuántos archivos se escribieron.
+    """
+    pendientes = [
+        (w, ext) for w in THUMB_WIDTHS for ext in THUMB_FORMATS
+        if not os.path.exists(os.path.join(settings.MEDIA_ROOT, _ruta_relativa(digest, w, ext)))
+    ]
+    if not pendientes:
+        return 0
+
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'L'):
+            fondo = Image.new('RGB', original.size, (255, 255, 255))
+            fondo.paste(original.convert('RGBA'), mask=original.convert('RGBA').getchannel('A'))
+            original = fondo
+        for width, ext in pendientes:
+            img = original.copy()
+            img.thumbnail((width, width * 4))  # nunca agranda
+            destino = os.path.join(settings.MEDIA_ROOT, _ruta_relativa(digest, width, ext))
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            tmp = f'{destino}.tmp'
+            img.save(tmp, THUMB_FORMATS[ext], quality=THUMB_QUALITY, optimize=True)
+            os.replace(tmp, destino)
+    return len(pendientes)
+
+
+def procesar_imagen(path: str) -> str:
+    """
+    Calcula el hash de la imagen y asegura sus miniaturas. Solo usa el disco (sirve en otro proceso).
+    """
+    digest = hash_archivo(path)
+    generar_derivados(path, digest)
+    return digest
+
+
+def actualizar_miniaturas(producto) -> None:
+    """
+    Sincroniza producto.imagen_hash con la imagen actual (tras crear o editar el producto).
+    """
+    from .models import Producto
+
+    digest = ''
+    if producto.imagen:
+        try:
+            digest = procesar_imagen(producto.imagen.path)
+        except (OSError, ValueError):
+            digest = ''
+    if digest != producto.imagen_hash:
+        producto.imagen_hash = digest
+        Producto.objects.filter(pk=producto.pk).update(imagen_hash=digest)
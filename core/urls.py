@@ -7,7 +7,9 @@ urlpatterns = [
 
     # Catálogo y compras
     path('catalogo/', views.catalogo, name='catalogo'),
+    path('catalogo/mas/', views.catalogo_mas, name='catalogo_mas'),
     path('carrito/', views.ver_carrito, name='ver_carrito'),
+    path('carrito/resumen/', views.carrito_resumen, name='carrito_resumen'),
     path('carrito/agregar/<int:id>/', views.agregar_al_carrito, name='agregar_al_carrito'),
     path('carrito/actualizar/<int:id>/', views.actualizar_cantidad_carrito, name='actualizar_cantidad_carrito'),
     path('carrito/eliminar/<int:id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
@@ -35,14 +37,20 @@ urlpatterns = [
     
     # Panel del administrador PRODUCTOS
     path('panel/productos/', views.productos_list, name='productos_list'),
+    path('panel/productos/exportar.csv', views.productos_csv, name='productos_csv'),
+    path('panel/productos/importar/', views.productos_importar, name='productos_importar'),
     path('panel/productos/nuevo/', views.producto_create, name='producto_create'),
     path('panel/productos/editar/<int:id>/', views.producto_edit, name='producto_edit'),
     path('panel/productos/habilitar/<int:id>/', views.producto_habilitar, name='producto_habilitar'),
     path('panel/productos/eliminar/<int:id>/', views.producto_delete, name='producto_delete'),
+    path('panel/tareas/<int:id>/', views.tarea_estado, name='tarea_estado'),
     path('panel/ventas/', views.ventas_panel, name='ventas_panel'),
+    path('panel/ventas/boletas.zip', views.ventas_boletas_zip, name='ventas_boletas_zip'),
 
     # Panel del administrador PEDIDOS
     path('panel/pedidos/', views.pedidos_list, name='pedidos_list'),
+    path('panel/pedidos/exportar.csv', views.pedidos_csv, name='pedidos_csv'),
+    path('panel/pedidos/cambiar-estado/', views.pedidos_cambiar_estado, name='pedidos_cambiar_estado'),
     path('panel/pedidos/<int:id>/', views.pedido_detalle, name='pedido_detalle'),
 
     # CLIENTE
@@ -50,6 +58,7 @@ urlpatterns = [
     
     # ADMIN CLIENTES
     path('panel/clientes/', views.clientes_list, name='clientes_list'),
+    path('panel/clientes/<int:id>/historial/', views.cliente_historial, name='cliente_historial'),
     path('panel/clientes/bloquear/<int:id>/', views.cliente_bloquear, name='cliente_bloquear'),
     path('panel/clientes/desbloquear/<int:id>/', views.cliente_desbloquear, name='cliente_desbloquear'),
     path('panel/clientes/eliminar/<int:id>/', views.cliente_eliminar, name='cliente_eliminar'),
@@ -64,8 +73,15 @@ urlpatterns = [
 
      # ADMIN SOLICITUDES DE CONFECCIÓN
     path('panel/solicitudes-confeccion/', views.solicitudes_confeccion_list, name='solicitudes_confeccion_list'),
+    path('panel/solicitudes-confeccion/exportar.csv', views.solicitudes_confeccion_csv, name='solicitudes_confeccion_csv'),
     path('panel/solicitudes-confeccion/<int:id>/', views.solicitud_confeccion_detalle, name='solicitud_confeccion_detalle'),
 
+    # Boletas (PDF generado al abrirla)
+    path('boleta/<str:tipo>/<int:id>.pdf', views.boleta, name='boleta'),
+
+    # Banner del catálogo
+    path('panel/banner/', views.banner_config, name='banner_config'),
+
     # Config alertas stock
     path('panel/alertas/stock/', views.set_low_stock_threshold, name='set_low_stock_threshold'),
 ]
@@ -0,0 +1,123 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Pedido, SolicitudConfeccion, VentaDiaria
+
+
+# origen -> (modelo, campo de fecha, campo de monto)
+ORIGENES = {
+    'pedido': (Pedido, 'fecha', 'total'),
+    'confeccion': (SolicitudConfeccion, 'fecha_creacion', 'cotizacion_monto'),
+}
+ORIGEN_POR_MODELO = {modelo: origen for origen, (modelo, _, _) in ORIGENES.items()}
+
+
+def dia_local(fecha):
+    # mismo criterio que los filtros "desde/hasta" del panel: fecha en la zona horaria del sitio
+    return timezone.localtime(fecha, timezone.get_default_timezone()).date()
+
+
+def foto_venta(origen: str, instancia):
+    """
+    (dia, estado, monto) de la instancia según lo que ya tiene cargado, o None si le falta
+    alguno de los campos (diferidos con only()) o aún no tiene fecha. No consulta la base.
+    """
+    _, campo_fecha, campo_monto = ORIGENES[origen]
+    datos = instancia.__dict__
+    if datos.get(campo_fecha) is None or 'estado' not in datos or campo_monto not in datos:
+        return None
+    return dia_local(datos[campo_fecha]), datos['estado'], datos[campo_monto] or Decimal('0')
+
+
+def foto_guardada(origen: str, pk):
+    """
+    Igual que foto_venta pero leyendo la fila guardada (una consulta); None si no existe.
+    """
+    modelo, campo_fecha, campo_monto = ORIGENES[origen]
+    fila = modelo.objects.filter(pk=pk).values_list(campo_fecha, 'estado', campo_monto).first()
+    if fila is None:
+        return None
+    return dia_local(fila[0]), fila[1], fila[2] or Decimal('0')
+
+
+def registrar_cambios(origen: str, cambios) -> None:
+    """
+    Aplica al resumen diario una lista de (antes, despues), cada uno una foto (dia, estado, monto)
+    o None (alta / baja). Los movimientos se acumulan por (dia, estado) y cada celda se
+    actualiza con un UPDATE relativo (F), insertándola si todavía no existe.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for antes, despues in cambios:
+        if antes == despues:
+            continue
+        if antes is not None:
+            delta = deltas[antes[:2]]
+            delta[0] -= 1
+            delta[1] -= antes[2]
+        if despues is not None:
+            delta = deltas[despues[:2]]
+            delta[0] += 1
+            delta[1] += despues[2]
+
+    with transaction.atomic():
+        for (dia, estado), (cantidad, monto) in deltas.items():
+            if not cantidad and not monto:
+                continue
+            celda = VentaDiaria.objects.filter(origen=origen, dia=dia, estado=estado)
+            if celda.update(cantidad=F('cantidad') + cantidad, total=F('total') + monto):
+                continue
+            try:
+                with transaction.atomic():
+                    VentaDiaria.objects.create(origen=origen, dia=dia, estado=estado, cantidad=cantidad, total=monto)
+            except IntegrityError:
+                # otra escritura creó la celda entre el UPDATE y el INSERT
+                celda.update(cantidad=F('cantidad') + cantidad, total=F('total') + monto)
+
+
+def totales_ventas(origen: str, desde=None, hasta=None, estado=None) -> Decimal:
+    """
+    Monto total de `origen` entre dos fechas locales (inclusive, None = sin límite), leído del
+    resumen diario: a lo más una fila por día y estado, sin tocar pedidos ni solicitudes.
+    """
+    qs = VentaDiaria.objects.filter(origen=origen)
+    if desde:
+        qs = qs.filter(dia__gte=desde)
+    if hasta:
+        qs = qs.filter(dia__lte=hasta)
+    if estado:
+        qs = qs.filter(estado=estado)
+    return qs.aggregate(total=Sum('total'))['total'] or Decimal('0')
+
+
+def reconstruir_resumen() -> int:
+    """
+    Rehace VentaDiaria desde pedidos y solicitudes con un GROUP BY por origen.
+    Devuelve la cantidad de filas escritas.
+    """
+    filas = calcular_resumen()
+    with transaction.atomic():
+        VentaDiaria.objects.all().delete()
+        VentaDiaria.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def calcular_resumen() -> list:
+    filas = []
+    for origen, (modelo, campo_fecha, campo_monto) in ORIGENES.items():
+        grupos = (
+            modelo.objects
+            .order_by()
+            .annotate(dia=TruncDate(campo_fecha, tzinfo=timezone.get_default_timezone()))
+            .values('dia', 'estado')
+            .annotate(cantidad=Count('id'), total=Sum(campo_monto))
+        )
+        filas.extend(
+            VentaDiaria(origen=origen, dia=g['dia'], estado=g['estado'], cantidad=g['cantidad'], total=g['total'] or 0)
+            for g in grupos
+        )
+    return filas
@@ -3,32 +3,55 @@ from django.contrib import messages
 from django.db.models import Q, Sum
 from django.views.decorators.cache import never_cache
 from decimal import Decimal
-from pathlib import Path
 from django.conf import settings
-from django.db.models import F
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout, get_user_model
-from .models import AdminUser, Categoria, Producto, Pedido, DetallePedido, Cliente, HistorialCliente, SolicitudConfeccion, AdminUser
+from .models import AdminUser, Categoria, Producto, Pedido, Cliente, HistorialCliente, SolicitudConfeccion, BannerImagen, Tarea
 from .decorators import admin_required
 from django.urls import reverse
 from .forms import SolicitudConfeccionForm, RegistroClienteForm
 from .validators import validar_telefono_formato
+from .cart import (
+    MAX_PRODUCT_QUANTITY, MAX_ORDER_TOTAL, PedidoDuplicado, StockInsuficiente, TotalExcedido,
+    emitir_token, normalizar_carrito, cotizar_carrito, pedido_por_token, registrar_pedido,
+)
+from .reservas import clave_reserva, liberar_reservas, reservar_carrito
+from .low_stock import low_stock_products
+from .search import buscar_productos
+from .pagination import decode_cursor, encode_cursor, keyset_page, paginar_admin
+from .banner import escanear_imagenes, fijar_imagenes, imagenes_banner
+from .thumbnails import actualizar_miniaturas
+from .storage import es_inmutable
+from .export import EXPORT_CHUNK, csv_streaming
+from .ventas import totales_ventas
+from .historial import pagina_historial, ultimas_acciones
+from .pedidos import (
+    CASCADA_SINCRONA_MAX, LOTE_MAXIMO, MOTIVO_DESCONTINUADO, TRANSICIONES,
+    pedidos_abiertos_con, rechazar_por_descontinuado, transicionar_lote,
+)
+from .tareas import encolar
+from .productos_csv import COLUMNAS, filas_exportacion, importar_productos, leer_precio_stock
+from .boletas import (
+    boleta_url, con_boleta, confeccion_tiene_boleta, contenido_confeccion, contenido_pedido, etag_boleta,
+    items_pedido, obtener_boleta, pedido_tiene_boleta, zip_boletas,
+)
 
 
-from django.db import transaction
 from django.views.decorators.csrf import csrf_protect
-from decimal import Decimal, InvalidOperation
 
 from django.views.decorators.http import require_POST
 
-from django.http import JsonResponse  
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, url_has_allowed_host_and_scheme
+from django.views.static import serve
 
-from collections import defaultdict
 
 from django.utils.functional import cached_property
 from django.utils import timezone
 from datetime import datetime, time as dt_time
 
+import io
 import random, string, time
 from django.contrib.auth.hashers import make_password
 
@@ -55,8 +78,6 @@ def _cart_count(request):
     carrito = request.session.get('carrito', {})
     return sum(int(q) for q in carrito.values())
 
-MAX_PRODUCT_QUANTITY = 200  # límite duro por producto en el carrito
-MAX_ORDER_TOTAL = Decimal('999999999999.99')  # límite seguro según max_digits=14, decimal_places=2
 
 
 def _low_stock_threshold(request):
@@ -66,16 +87,16 @@ def _low_stock_threshold(request):
     except (TypeError, ValueError):
         return 5
 
-def _low_stock_products(threshold: int):
-    qs = Producto.objects.filter(activo=True, stock__lte=threshold).annotate(nombre_display=F('nombre'))
-    return list(qs)
+LOW_STOCK_ALERT_LIMIT = 50  # alertas que se dibujan en el panel; el resto se ve en productos_list
+
 
 def _low_stock_context(request):
     threshold = _low_stock_threshold(request)
-    productos = _low_stock_products(threshold)
+    productos = low_stock_products(threshold)
     return {
-        'low_stock_products': productos,
+        'low_stock_products': productos[:LOW_STOCK_ALERT_LIMIT],
         'low_stock_count': len(productos),
+        'low_stock_restantes': max(0, len(productos) - LOW_STOCK_ALERT_LIMIT),
         'low_stock_threshold': threshold,
     }
 
@@ -98,148 +119,169 @@ def set_low_stock_threshold(request):
     return redirect(next_url)
 
 
-def _boleta_path(tipo: str, obj_id: int) -> Path:
-    base = Path(settings.MEDIA_ROOT) / "boletas"
-    base.mkdir(parents=True, exist_ok=True)
-    return base / f"{tipo}_{obj_id}.pdf"
+@admin_required
+@csrf_protect
+def banner_config(request):
+    """
+    Fija las imágenes del banner del catálogo. Sin imágenes fijadas se usan las de media/.
+    """
+    disponibles = escanear_imagenes()
+    if request.method == 'POST':
+        validas = set(disponibles)
+        rutas = [r for r in request.POST.getlist('rutas') if r in validas]
+        fijar_imagenes(rutas)
+        if rutas:
+            messages.success(request, f'Se fijaron {len(rutas)} imágenes para el banner.')
+        else:
+            messages.success(request, 'Banner sin imágenes fijadas: se usarán las de la carpeta de medios.')
+        return redirect('banner_config')
 
+    fijadas = list(BannerImagen.objects.values_list('ruta', flat=True))
+    ctx = {
+        'fijadas': fijadas,
+        'disponibles': [
+            {'ruta': r, 'url': f"{settings.MEDIA_URL.rstrip('/')}/{r}", 'fijada': r in fijadas}
+            for r in disponibles
+        ],
+    }
+    ctx.update(_low_stock_context(request))
+    return render(request, 'core/banner_config.html', ctx)
 
-def _boleta_url(tipo: str, obj_id: int) -> str:
-    return f"{settings.MEDIA_URL.rstrip('/')}/boletas/{tipo}_{obj_id}.pdf"
 
+MEDIA_CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
 
-def _render_boleta_pdf(title: str, lines: list[str], path: Path) -> None:
+
+def servir_media(request, path):
     """
-    Genera un PDF mínimo con texto plano para la boleta sin dependencias externas.
+    Sirve MEDIA_ROOT. Los archivos nombrados por hash de contenido (imágenes de productos y
+    miniaturas) nunca cambian, así que el navegador puede cachearlos un año sin revalidar.
     """
-    content_lines = []
-    y_offset = 0
-    for line in lines:
-        content_lines.append(f"0 -14 Td ({line}) Tj")
-        y_offset -= 14
-
-    stream_parts = [
-        "BT",
-        "/F1 12 Tf",
-        "50 780 Td",
-        f"({title}) Tj",
-        "/F1 10 Tf",
-        *content_lines,
-        "ET",
-    ]
-    stream = "\n".join(stream_parts)
-    stream_bytes = stream.encode("latin-1", "replace")
-
-    pdf_chunks = [
-        "%PDF-1.4",
-        "1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj",
-        "2 0 obj << /Type /Pages /Count 1 /Kids [3 0 R] >> endobj",
-        "3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >> endobj",
-        f"4 0 obj << /Length {len(stream_bytes)} >> stream\n",
-    ]
-    pdf_bytes = "\n".join(pdf_chunks).encode() + stream_bytes + b"\nendstream\nendobj\n"
-    pdf_bytes += b"5 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if es_inmutable(path):
+        response['Cache-Control'] = MEDIA_CACHE_INMUTABLE
+    return response
 
-    # tabla xref simple
-    objects = pdf_bytes.split(b"endobj")
-    offsets = []
-    cursor = 0
-    for part in objects[:-1]:
-        offsets.append(cursor)
-        cursor += len(part) + len(b"endobj\n")
-    offsets.append(cursor)
 
-    xref_lines = ["xref", f"0 {len(offsets)}", "0000000000 65535 f "]
-    for off in offsets[1:]:
-        xref_lines.append(f"{off:010d} 00000 n ")
+def _boleta_pedido(pedido):
+    """
+    Solo arma la URL: el PDF se genera al abrirla (vista boleta), nunca al listar.
+    """
+    return boleta_url('pedido', pedido.id) if pedido_tiene_boleta(pedido) else None
 
-    xref = "\n".join(xref_lines).encode() + b"\n"
-    trailer = f"trailer << /Size {len(offsets)} /Root 1 0 R >>\nstartxref\n{len(pdf_bytes)}\n%%EOF"
-    final_pdf = pdf_bytes + xref + trailer.encode()
-    path.write_bytes(final_pdf)
 
+def _boleta_confeccion(solicitud):
+    return boleta_url('confeccion', solicitud.id) if confeccion_tiene_boleta(solicitud) else None
 
-def _boleta_pedido(pedido):
-    if pedido.estado != "finalizado":
-        return None
-    pdf_path = _boleta_path("pedido", pedido.id)
-    if not pdf_path.exists():
-        lines = [
-            f"Cliente: {pedido.nombre_cliente}",
-            f"Correo: {pedido.correo}",
-            f"Dirección: {pedido.direccion}",
-            f"Fecha: {pedido.fecha:%d/%m/%Y %H:%M}",
-            f"Estado: {pedido.estado}",
-            f"Total: {pedido.total}",
-        ]
-        _render_boleta_pdf(f"Boleta Pedido #{pedido.id}", lines, pdf_path)
-    return _boleta_url("pedido", pedido.id)
 
+def _puede_ver_boleta(request, tipo, obj) -> bool:
+    if 'admin_id' in request.session:
+        return True
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    if tipo == 'pedido':
+        return obj.cliente_id == user.pk
+    return obj.cliente_id == user.pk or (obj.cliente_id is None and obj.correo == user.email)
 
-def _boleta_confeccion(solicitud):
-    if solicitud.cotizacion_aceptada is not True:
-        return None
-    pdf_path = _boleta_path("confeccion", solicitud.id)
-    if not pdf_path.exists():
-        lines = [
-            f"Cliente: {solicitud.nombre}",
-            f"Correo: {solicitud.correo}",
-            f"Teléfono: {solicitud.telefono}",
-            f"Fecha: {solicitud.fecha_creacion:%d/%m/%Y %H:%M}",
-            f"Prenda: {solicitud.get_tipo_prenda_display()}",
-            f"Estado: {solicitud.get_estado_display()}",
-        ]
-        if solicitud.cotizacion_monto:
-            lines.append(f"Cotización: {solicitud.cotizacion_monto}")
-        _render_boleta_pdf(f"Boleta Confección #{solicitud.id}", lines, pdf_path)
-    return _boleta_url("confeccion", solicitud.id)
 
-def catalogo(request):
+def boleta(request, tipo, id):
+    """
+    Entrega la boleta en PDF (generada en memoria y cacheada) con ETag/Last-Modified;
+    si el navegador ya la tiene responde 304 sin generar nada.
+    """
+    if tipo == 'pedido':
+        obj = get_object_or_404(Pedido, id=id)
+        disponible = pedido_tiene_boleta(obj)
+    elif tipo == 'confeccion':
+        obj = get_object_or_404(SolicitudConfeccion, id=id)
+        disponible = confeccion_tiene_boleta(obj)
+    else:
+        raise Http404
+    if not disponible or not _puede_ver_boleta(request, tipo, obj):
+        raise Http404
+
+    if tipo == 'pedido':
+        title, lines = contenido_pedido(obj, items_pedido(obj.detalles.all()))
+    else:
+        title, lines = contenido_confeccion(obj)
+    etag = quote_etag(etag_boleta(title, lines))
+    no_modificada = get_conditional_response(request, etag=etag)
+    if no_modificada is not None:
+        no_modificada['Cache-Control'] = 'private, no-cache'
+        return no_modificada
+
+    datos = obtener_boleta(title, lines)
+    response = FileResponse(
+        io.BytesIO(datos['pdf']),
+        content_type='application/pdf',
+        filename=f'boleta_{tipo}_{obj.id}.pdf',
+    )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(datos['generado'].timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+CATALOGO_PAGE_SIZE = 24
+
+
+def _catalogo_pagina(request):
+    """
+    Página del catálogo según los filtros del GET.
+    Sin búsqueda: keyset sobre id (cada página cuesta lo mismo). Con búsqueda: el ranking bm25
+    ya viene acotado a FTS_MAX_RESULTS, así que se pagina por posición dentro de él.
+    """
     query = request.GET.get('q')
     categoria_id = request.GET.get('categoria')
+    cursor = request.GET.get('cursor')
 
-    productos = Producto.objects.filter(activo=True)
-    categorias = Categoria.objects.all()
-
+    productos = (
+        Producto.objects
+        .filter(activo=True)
+        .select_related('categoria')
+        .only('id', 'nombre', 'precio', 'imagen', 'imagen_hash', 'categoria__nombre')
+    )
     if categoria_id:
         productos = productos.filter(categoria_id=categoria_id)
-    if query:
-        productos = productos.filter(Q(nombre__icontains=query) | Q(descripcion__icontains=query))
-
-    # Selecciona imágenes para el banner (prioridad: media/productos, luego media/fotos, luego fotos de productos)
-    import os
-    from django.conf import settings
-    banner_images = []
-    target_imgs = 8
-
-    def add_from_dir(folder):
-        base = os.path.join(settings.MEDIA_ROOT, folder)
-        if os.path.isdir(base):
-            for fname in sorted(os.listdir(base)):
-                if fname.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                    rel = f'/{folder}/{fname}'
-                    banner_images.append(settings.MEDIA_URL.rstrip('/') + rel)
-                    if len(banner_images) >= target_imgs:
-                        return
-
-    add_from_dir('productos')
-    if len(banner_images) < target_imgs:
-        add_from_dir('fotos')
-
-    if len(banner_images) < target_imgs:
-        for p in productos.exclude(imagen='').exclude(imagen__isnull=True):
-            try:
-                banner_images.append(p.imagen.url)
-            except Exception:
-                continue
-            if len(banner_images) >= target_imgs:
-                break
 
+    if not query:
+        return keyset_page(productos, ('id',), cursor, CATALOGO_PAGE_SIZE)
+
+    offset = decode_cursor(cursor)
+    offset = offset if isinstance(offset, int) and offset > 0 else 0
+    items = list(buscar_productos(productos, query)[offset:offset + CATALOGO_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(items) > CATALOGO_PAGE_SIZE:
+        items = items[:CATALOGO_PAGE_SIZE]
+        next_cursor = encode_cursor(offset + CATALOGO_PAGE_SIZE)
+    return items, next_cursor
+
+
+def catalogo_mas(request):
+    """
+    Fragmento HTML con la página siguiente del catálogo (scroll infinito / botón "Ver más").
+    El cursor de la página que sigue viaja en la cabecera X-Next-Cursor.
+    """
+    productos, next_cursor = _catalogo_pagina(request)
+    response = render(request, 'core/partials/catalogo_items.html', {'productos': productos})
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+
+def catalogo(request):
+    query = request.GET.get('q')
+    categoria_id = request.GET.get('categoria')
+
+    productos, next_cursor = _catalogo_pagina(request)
+    categorias = Categoria.objects.all()
+
+    # Imágenes del banner desde el manifiesto en caché (sin listar media/ en cada request)
+    banner_images = imagenes_banner()
     while len(banner_images) < 4:
         banner_images.append('')
 
     return render(request, 'core/catalogo.html', {
         'productos': productos,
+        'next_cursor': next_cursor,
         'categorias': categorias,
         'categoria_id': categoria_id,
         'query': query,
@@ -361,17 +403,12 @@ def editar_perfil(request):
             except ValueError as exc:
                 messages.error(request, str(exc))
             else:
-                old_username = user.username
                 user.username = username
                 user.email = email
                 user.direccion = direccion
                 user.telefono = telefono_normalizado
                 user.save()
 
-                if old_username != username:
-                    Pedido.objects.filter(nombre_cliente=old_username).update(nombre_cliente=username)
-                    HistorialCliente.objects.filter(nombre=old_username).update(nombre=username)
-
                 messages.success(request, 'Perfil actualizado correctamente.')
                 return redirect('editar_perfil')
 
@@ -455,36 +492,39 @@ def categoria_delete(request, id):
 @admin_required
 def clientes_list(request):
     search = (request.GET.get('q') or '').strip()
-    clientes = Cliente.objects.all().order_by('username')
+    clientes_qs = Cliente.objects.all()
     if search:
-        clientes = clientes.filter(Q(username__icontains=search) | Q(email__icontains=search))
-    nombres = list(clientes.values_list('username', flat=True))
-    historial_qs = HistorialCliente.objects.filter(nombre__in=nombres).order_by('-fecha')
-    historial_por_cliente = defaultdict(list)
-    for h in historial_qs:
-        historial_por_cliente[h.nombre].append(h)
-    resumen = []
+        clientes_qs = clientes_qs.filter(Q(username__icontains=search) | Q(email__icontains=search))
+    pagina = paginar_admin(
+        request, clientes_qs, ('username', 'id'),
+        campos=('email', 'bloqueado', 'is_staff', 'is_superuser', 'date_joined'),
+    )
+    clientes = pagina.items
+    ultimas = ultimas_acciones([c.id for c in clientes])
     for c in clientes:
-        lst = historial_por_cliente.get(c.username, [])
-        last = lst[0] if lst else None
-        resumen.append({
-            'username': c.username,
-            'correo': c.email,
-            'accion': last.accion if last else '—',
-            'fecha': last.fecha if last else None,
-            'tiene_historial': bool(lst),
-        })
+        c.ultima_accion = ultimas.get(c.id)
 
     ctx = {
         'clientes': clientes,
-        'resumen': resumen,
-        'historial_por_cliente': historial_por_cliente,
+        'pagina': pagina,
         'search': search,
     }
     ctx.update(_low_stock_context(request))
     return render(request, 'core/clientes_list.html', ctx)
 
 
+@admin_required
+def cliente_historial(request, id):
+    """
+    Fragmento HTML con un tramo del historial del cliente (se pide al expandirlo en clientes_list).
+    El cursor del tramo siguiente viaja en la cabecera X-Next-Cursor.
+    """
+    acciones, next_cursor = pagina_historial(id, request.GET.get('cursor'))
+    response = render(request, 'core/partials/historial_filas.html', {'acciones': acciones})
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+
 @admin_required
 @require_POST
 @csrf_protect
@@ -492,7 +532,7 @@ def cliente_bloquear(request, id):
     cliente = get_object_or_404(Cliente, id=id)
     cliente.bloqueado = True
     cliente.save()
-    HistorialCliente.objects.create(nombre=cliente.username, correo=cliente.email, accion='bloqueado')
+    HistorialCliente.objects.create(cliente=cliente, nombre=cliente.username, correo=cliente.email, accion='bloqueado')
     messages.error(request, f'Cliente {cliente.username} bloqueado.')
     return redirect('clientes_list')
 
@@ -504,7 +544,7 @@ def cliente_desbloquear(request, id):
     cliente = get_object_or_404(Cliente, id=id)
     cliente.bloqueado = False
     cliente.save()
-    HistorialCliente.objects.create(nombre=cliente.username, correo=cliente.email, accion='desbloqueado')
+    HistorialCliente.objects.create(cliente=cliente, nombre=cliente.username, correo=cliente.email, accion='desbloqueado')
     messages.success(request, f'Cliente {cliente.username} desbloqueado.')
     return redirect('clientes_list')
 
@@ -534,30 +574,68 @@ def productos_list(request):
     sort = (request.GET.get('sort') or '').strip()
     show = (request.GET.get('show') or 'activos').strip()
     order_map = {
-        'categoria': 'categoria__nombre',
-        'stock_asc': 'stock',
-        'stock_desc': '-stock',
-        'precio_asc': 'precio',
-        'precio_desc': '-precio',
-        'nombre': 'nombre',
+        'categoria': ('categoria__nombre', 'id'),
+        'stock_asc': ('stock', 'id'),
+        'stock_desc': ('-stock', 'id'),
+        'precio_asc': ('precio', 'id'),
+        'precio_desc': ('-precio', 'id'),
+        'nombre': ('nombre', 'id'),
     }
-    productos = Producto.objects.all()
+    productos = Producto.objects.select_related('categoria')
     if show == 'activos':
         productos = productos.filter(activo=True)
     elif show == 'inactivos':
         productos = productos.filter(activo=False)
     else:
         show = 'todos'
-    if sort in order_map:
-        productos = productos.order_by(order_map[sort])
-    else:
-        productos = productos.order_by('id')
 
-    ctx = {'productos': productos, 'sort': sort, 'show': show}
+    pagina = paginar_admin(
+        request, productos, order_map.get(sort, ('id',)),
+        campos=('nombre', 'precio', 'stock', 'activo', 'categoria__nombre'),
+    )
+    ctx = {'productos': pagina.items, 'pagina': pagina, 'sort': sort, 'show': show}
+    ctx['tarea'] = _tarea_de(request)
     ctx.update(_low_stock_context(request))
     return render(request, 'core/productos_list.html', ctx)
 
 
+@admin_required
+def productos_csv(request):
+    """
+    Exporta todos los productos a CSV, fila a fila; el archivo se puede editar y volver a importar.
+    """
+    filas = filas_exportacion(Producto.objects.all()).iterator(chunk_size=EXPORT_CHUNK)
+    return csv_streaming(f'productos_{timezone.localdate():%Y%m%d}.csv', COLUMNAS, filas)
+
+
+@admin_required
+@csrf_protect
+def productos_importar(request):
+    """
+    Alta y actualización masiva de productos desde un CSV (ver core.productos_csv), con el
+    detalle de las filas rechazadas.
+    """
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            messages.error(request, 'Selecciona un archivo CSV.')
+        else:
+            resultado = importar_productos(archivo)
+            messages.success(
+                request,
+                f'Importación terminada: {resultado.creados} creados, {resultado.actualizados} actualizados, '
+                f'{resultado.sin_cambios} sin cambios.'
+            )
+            if resultado.total_errores:
+                messages.error(request, f'{resultado.total_errores} filas con errores no se importaron.')
+    return render(request, 'core/productos_importar.html', {
+        'resultado': resultado,
+        'columnas': COLUMNAS,
+        **_low_stock_context(request),
+    })
+
+
 @admin_required
 @csrf_protect
 def producto_create(request):
@@ -574,13 +652,8 @@ def producto_create(request):
             messages.error(request, 'Nombre, precio y stock son obligatorios.')
         else:
             try:
-                precio = Decimal(precio_raw).quantize(Decimal('0.01'))
-                stock = int(stock_raw)
-                max_precio = Decimal('9999999.99')  # max 7 digitos (parte entera)
-                max_stock = 9999999  # max 7 digitos
-                if precio < 0 or stock < 0 or precio > max_precio or stock > max_stock:
-                    raise ValueError
-            except (InvalidOperation, ValueError):
+                precio, stock = leer_precio_stock(precio_raw, stock_raw)
+            except ValueError:
                 messages.error(request, 'Precio o stock invalidos o demasiado altos.')
                 return render(request, 'core/producto_form.html', {'categorias': categorias, **_low_stock_context(request)})
 
@@ -588,7 +661,7 @@ def producto_create(request):
             if categoria_id:
                 categoria_obj = get_object_or_404(Categoria, id=categoria_id)
 
-            Producto.objects.create(
+            producto = Producto.objects.create(
                 nombre=nombre,
                 descripcion=descripcion,
                 precio=precio,
@@ -596,6 +669,8 @@ def producto_create(request):
                 categoria=categoria_obj,
                 imagen=imagen
             )
+            if imagen:
+                actualizar_miniaturas(producto)
             messages.success(request, 'Producto creado correctamente.')
             return redirect('productos_list')
     return render(request, 'core/producto_form.html', {
@@ -621,24 +696,19 @@ def producto_edit(request, id):
         producto.nombre = (request.POST.get('nombre') or '').strip()
         producto.descripcion = (request.POST.get('descripcion') or '').strip()
         try:
-            precio_raw = request.POST.get('precio')
-            stock_raw = request.POST.get('stock')
-            max_precio = Decimal('9999999.99')
-            max_stock = 9999999
-
-            producto.precio = Decimal(precio_raw).quantize(Decimal('0.01'))
-            producto.stock = int(stock_raw)
-            if producto.precio < 0 or producto.stock < 0 or producto.precio > max_precio or producto.stock > max_stock:
-                raise ValueError
-        except (InvalidOperation, ValueError):
+            producto.precio, producto.stock = leer_precio_stock(request.POST.get('precio'), request.POST.get('stock'))
+        except ValueError:
             messages.error(request, 'Precio o stock invalidos o demasiado altos.')
             return render(request, 'core/producto_form.html', {'producto': producto, 'categorias': categorias, **_low_stock_context(request)})
 
         categoria_id = request.POST.get('categoria') or None
         producto.categoria_id = categoria_id if categoria_id else None
-        if request.FILES.get('imagen'):
-            producto.imagen = request.FILES.get('imagen')
+        nueva_imagen = request.FILES.get('imagen')
+        if nueva_imagen:
+            producto.imagen = nueva_imagen
         producto.save()
+        if nueva_imagen:
+            actualizar_miniaturas(producto)
         messages.success(request, 'Producto actualizado correctamente.')
         return redirect('productos_list')
     return render(request, 'core/producto_form.html', {
@@ -665,33 +735,44 @@ def producto_delete(request, id):
     producto.activo = False
     producto.save(update_fields=['activo'])
 
-    # Rechaza pedidos abiertos que incluyan este producto descontinuado
-    motivo_rechazo = 'Producto descontinuado.'
-    pedidos_afectados = (
-        Pedido.objects
-        .filter(detalles__producto=producto)
-        .exclude(estado__in=['rechazado', 'finalizado'])
-        .distinct()
-    )
-    rechazados = 0
-    with transaction.atomic():
-        for pedido in pedidos_afectados:
-            pedido.estado = 'rechazado'
-            pedido.motivo_rechazo = motivo_rechazo
-            pedido.save(update_fields=['estado', 'motivo_rechazo'])
-            HistorialCliente.objects.create(
-                nombre=pedido.nombre_cliente,
-                correo=pedido.correo,
-                accion=f'Pedido {pedido.id} -> rechazado por producto descontinuado'
-            )
-            rechazados += 1
+    # Rechaza pedidos abiertos que incluyan este producto descontinuado: un UPDATE y un
+    # bulk_create; si son muchos, por tramos en segundo plano para no retener el lock de escritura
+    abiertos = pedidos_abiertos_con(producto.id).count()
+    if abiertos > CASCADA_SINCRONA_MAX:
+        tarea = encolar('descontinuar_producto', total=abiertos, producto_id=producto.id)
+        messages.warning(request, f'Rechazando {abiertos} pedidos abiertos asociados a este producto en segundo plano (motivo: {MOTIVO_DESCONTINUADO}).')
+        messages.success(request, 'Producto deshabilitado. Ya no aparecera en el catalogo.')
+        return redirect(f"{reverse('productos_list')}?tarea={tarea.id}")
 
+    rechazados = rechazar_por_descontinuado(producto.id) if abiertos else 0
     if rechazados:
-        messages.warning(request, f'Se rechazaron {rechazados} pedidos abiertos asociados a este producto (motivo: {motivo_rechazo}).')
+        messages.warning(request, f'Se rechazaron {rechazados} pedidos abiertos asociados a este producto (motivo: {MOTIVO_DESCONTINUADO}).')
     messages.success(request, 'Producto deshabilitado. Ya no aparecera en el catalogo.')
     return redirect('productos_list')
 
 
+def _tarea_de(request):
+    """
+    Tarea de ?tarea= (la que acaba de lanzar el admin) para mostrar su barra de progreso.
+    """
+    tarea_id = request.GET.get('tarea') or ''
+    return Tarea.objects.filter(id=tarea_id).first() if tarea_id.isdigit() else None
+
+
+@admin_required
+def tarea_estado(request, id):
+    """
+    Avance de una tarea del panel en JSON (lo consulta la barra de progreso).
+    """
+    tarea = get_object_or_404(Tarea, id=id)
+    return JsonResponse({
+        'estado': tarea.estado,
+        'total': tarea.total,
+        'procesados': tarea.procesados,
+        'error': tarea.error,
+    })
+
+
 @admin_required
 @csrf_protect
 def producto_habilitar(request, id):
@@ -707,8 +788,11 @@ def producto_habilitar(request, id):
 
 # ------------------- PEDIDOS -------------------
 
-@admin_required
-def pedidos_list(request):
+def _filtrar_pedidos(request):
+    """
+    Filtros del listado de pedidos (id, estado y rango de fechas), compartidos con su exportación CSV.
+    Devuelve (pedidos_qs, filtros).
+    """
     pedido_id = (request.GET.get('pedido_id') or '').strip()
     estado = (request.GET.get('estado') or 'todos').strip()
     fecha_desde_raw = (request.GET.get('desde') or '').strip()
@@ -755,37 +839,99 @@ def pedidos_list(request):
     elif fecha_hasta:
         pedidos_qs = pedidos_qs.filter(fecha__lte=timezone.make_aware(datetime.combine(fecha_hasta, dt_time.max)))
 
-    pedidos = list(pedidos_qs.order_by('-fecha'))
-    total_pedidos = pedidos_qs.aggregate(total=Sum('total'))['total'] or Decimal('0')
+    filtros = {
+        'pedido_id': pedido_id,
+        'estado': estado,
+        'fecha_desde': fecha_desde_raw,
+        'fecha_hasta': fecha_hasta_raw,
+    }
+    return pedidos_qs, filtros
 
-    # Colecta identificadores presentes en la tabla de pedidos
-    usernames = {p.nombre_cliente for p in pedidos if p.nombre_cliente}
-    correos = {p.correo for p in pedidos if p.correo}
 
-    # Índices para lookup rápido
-    clientes = Cliente.objects.filter(Q(username__in=usernames) | Q(email__in=correos)) \
-                              .values('username', 'email', 'bloqueado')
-    block_by_user = {c['username']: c['bloqueado'] for c in clientes}
-    block_by_mail = {c['email']: c['bloqueado'] for c in clientes}
+@admin_required
+def pedidos_list(request):
+    pedidos_qs, filtros = _filtrar_pedidos(request)
+
+    # la cuenta (username actual y bloqueo) viene en el mismo SELECT de la página
+    pagina = paginar_admin(
+        request, pedidos_qs.select_related('cliente'), ('-fecha', '-id'),
+        campos=('nombre_cliente', 'correo', 'estado', 'total', 'cliente__username', 'cliente__bloqueado'),
+        agregados={'total': Sum('total')},
+    )
+    pedidos = pagina.items
+    total_pedidos = pagina.totales['total'] or Decimal('0')
 
     for p in pedidos:
-        p.bloqueado = bool(block_by_user.get(p.nombre_cliente) or block_by_mail.get(p.correo))
+        p.bloqueado = bool(p.cliente_id and p.cliente.bloqueado)
 
     low_stock = _low_stock_context(request)
 
     return render(request, 'core/pedidos_list.html', {
         'pedidos': pedidos,
-        'pedido_id': pedido_id,
-        'estado': estado,
-        'fecha_desde': fecha_desde_raw,
-        'fecha_hasta': fecha_hasta_raw,
+        'pagina': pagina,
+        **filtros,
         'total_pedidos': total_pedidos,
+        'estados': Pedido.ESTADOS,
+        'tarea': _tarea_de(request),
         **low_stock,
     })
 
 
 @admin_required
-def ventas_panel(request):
+@require_POST
+@csrf_protect
+def pedidos_cambiar_estado(request):
+    """
+    Acción masiva del listado: cambia el estado de los pedidos seleccionados con un UPDATE y un
+    bulk_create del historial. Los que no admiten la transición (ver TRANSICIONES) se omiten.
+    Opcionalmente deja en cola el archivo de las boletas de los recién finalizados.
+    """
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = reverse('pedidos_list')
+    nuevo_estado = request.POST.get('estado')
+    ids = {int(i) for i in request.POST.getlist('ids') if i.isdigit()}
+
+    if nuevo_estado not in TRANSICIONES:
+        messages.error(request, 'Estado inválido.')
+        return redirect(next_url)
+    if not ids:
+        messages.error(request, 'Selecciona al menos un pedido.')
+        return redirect(next_url)
+    if len(ids) > LOTE_MAXIMO:
+        messages.error(request, f'Se pueden cambiar hasta {LOTE_MAXIMO} pedidos a la vez.')
+        return redirect(next_url)
+
+    motivo = (request.POST.get('motivo') or '').strip()
+    cambiados = transicionar_lote(ids, nuevo_estado, motivo)
+    omitidos = len(ids) - len(cambiados)
+
+    messages.success(request, f'{len(cambiados)} pedidos actualizados a {nuevo_estado}.')
+    if omitidos:
+        messages.warning(request, f'{omitidos} pedidos se omitieron: su estado actual no permite pasar a {nuevo_estado}.')
+    if nuevo_estado == 'finalizado' and cambiados and request.POST.get('boletas'):
+        tarea = encolar('archivar_boletas', total=len(cambiados), pedido_ids=cambiados)
+        separador = '&' if '?' in next_url else '?'
+        return redirect(f'{next_url}{separador}tarea={tarea.id}')
+    return redirect(next_url)
+
+
+@admin_required
+def pedidos_csv(request):
+    """
+    Exporta a CSV los pedidos que cumplen los filtros del listado, fila a fila (sin cargarlos todos).
+    """
+    pedidos_qs, _ = _filtrar_pedidos(request)
+    columnas = ['id', 'fecha', 'nombre_cliente', 'correo', 'direccion', 'estado', 'total', 'motivo_rechazo']
+    filas = pedidos_qs.order_by('-fecha', '-id').values_list(*columnas).iterator(chunk_size=EXPORT_CHUNK)
+    return csv_streaming(f'pedidos_{timezone.localdate():%Y%m%d}.csv', columnas, filas)
+
+
+def _filtrar_ventas(request):
+    """
+    Filtros de estado y rango de fechas del panel de ventas (compartidos con la exportación de boletas).
+    Devuelve (pedidos_qs, solicitudes_qs, filtros) con los valores tal como se muestran en el formulario.
+    """
     estado_pedido = (request.GET.get('estado_pedido') or 'todos').strip()
     estado_confeccion = (request.GET.get('estado_confeccion') or 'todos').strip()
     fecha_desde_raw = (request.GET.get('desde') or '').strip()
@@ -832,12 +978,40 @@ def ventas_panel(request):
         pedidos_qs = pedidos_qs.filter(fecha__lte=timezone.make_aware(datetime.combine(fecha_hasta, dt_time.max)))
         solicitudes_qs = solicitudes_qs.filter(fecha_creacion__lte=timezone.make_aware(datetime.combine(fecha_hasta, dt_time.max)))
 
-    pedidos = list(pedidos_qs.order_by('-fecha')[:50])
-    solicitudes = list(solicitudes_qs.order_by('-fecha_creacion')[:50])
+    filtros = {
+        'estado_pedido': estado_pedido,
+        'estado_confeccion': estado_confeccion,
+        'fecha_desde': fecha_desde_raw,
+        'fecha_hasta': fecha_hasta_raw,
+        # fechas ya validadas (date o None), para consultar el resumen diario
+        'rango': (fecha_desde, fecha_hasta),
+    }
+    return pedidos_qs, solicitudes_qs, filtros
+
 
-    total_pedidos = pedidos_qs.aggregate(total=Sum('total'))['total'] or Decimal('0')
-    total_cotizaciones = solicitudes_qs.aggregate(total=Sum('cotizacion_monto'))['total'] or Decimal('0')
-    ventas_totales = (total_pedidos or Decimal('0')) + (total_cotizaciones or Decimal('0'))
+@admin_required
+def ventas_panel(request):
+    """
+    Los totales salen del resumen diario (VentaDiaria); de las tablas crudas solo se leen
+    los 50 pedidos y solicitudes más recientes que se listan.
+    """
+    pedidos_qs, solicitudes_qs, filtros = _filtrar_ventas(request)
+    desde, hasta = filtros['rango']
+
+    pedidos = list(
+        pedidos_qs.select_related('cliente').order_by('-fecha', '-id')
+        .only('id', 'nombre_cliente', 'fecha', 'total', 'estado', 'cliente__username')[:50]
+    )
+    solicitudes = list(
+        solicitudes_qs.order_by('-fecha_creacion', '-id')
+        .only('id', 'nombre', 'fecha_creacion', 'cotizacion_monto', 'estado')[:50]
+    )
+
+    estado_pedido = filtros['estado_pedido'] if filtros['estado_pedido'] != 'todos' else None
+    estado_confeccion = filtros['estado_confeccion'] if filtros['estado_confeccion'] != 'todos' else None
+    total_pedidos = totales_ventas('pedido', desde, hasta, estado_pedido)
+    total_cotizaciones = totales_ventas('confeccion', desde, hasta, estado_confeccion)
+    ventas_totales = total_pedidos + total_cotizaciones
 
     ctx = {
         'pedidos': pedidos,
@@ -845,23 +1019,37 @@ def ventas_panel(request):
         'total_pedidos': total_pedidos,
         'total_cotizaciones': total_cotizaciones,
         'ventas_totales': ventas_totales,
-        'estado_pedido': estado_pedido,
-        'estado_confeccion': estado_confeccion,
-        'fecha_desde': fecha_desde_raw,
-        'fecha_hasta': fecha_hasta_raw,
+        **filtros,
     }
     ctx.update(_low_stock_context(request))
     return render(request, 'core/ventas.html', ctx)
 
+@admin_required
+def ventas_boletas_zip(request):
+    """
+    Descarga en un zip las boletas de los pedidos y confecciones que cumplen los filtros del
+    panel de ventas. El zip se arma y se envía de a una boleta (StreamingHttpResponse).
+    """
+    pedidos_qs, solicitudes_qs, filtros = _filtrar_ventas(request)
+    ids = {
+        'pedido': list(con_boleta('pedido', pedidos_qs).order_by('fecha', 'id').values_list('id', flat=True)),
+        'confeccion': list(
+            con_boleta('confeccion', solicitudes_qs).order_by('fecha_creacion', 'id').values_list('id', flat=True)
+        ),
+    }
+    nombre = f"boletas_{filtros['fecha_desde'] or 'inicio'}_{filtros['fecha_hasta'] or 'hoy'}.zip"
+    response = StreamingHttpResponse(zip_boletas(ids), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
 @admin_required
 def pedido_detalle(request, id):
-    pedido = get_object_or_404(Pedido, id=id)
+    pedido = get_object_or_404(Pedido.objects.select_related('cliente'), id=id)
     detalles = pedido.detalles.all()
     pedido.boleta_url = _boleta_pedido(pedido)
 
-    bloqueado = Cliente.objects.filter(
-        username=pedido.nombre_cliente
-    ).values_list('bloqueado', flat=True).first() or False
+    bloqueado = bool(pedido.cliente_id and pedido.cliente.bloqueado)
 
     if request.method == 'POST':
         nuevo_estado = request.POST.get('estado')
@@ -881,6 +1069,7 @@ def pedido_detalle(request, id):
             accion = f'Pedido {pedido.id} -> {nuevo_estado}'
 
         HistorialCliente.objects.create(
+            cliente_id=pedido.cliente_id,
             nombre=pedido.nombre_cliente,
             correo=pedido.correo,
             accion=accion
@@ -901,10 +1090,10 @@ def pedido_detalle(request, id):
 
 # ------------------- SOLICITUDES DE CONFECCIÓN (ADMIN) -------------------
 
-@admin_required
-def solicitudes_confeccion_list(request):
+def _filtrar_solicitudes(request):
     """
-    Lista todas las solicitudes de confección para el panel de administración.
+    Filtros del listado de solicitudes de confección, compartidos con su exportación CSV.
+    Devuelve (solicitudes_qs, filtros).
     """
     estado = (request.GET.get('estado') or 'todos').strip()
     fecha_desde_raw = (request.GET.get('desde') or '').strip()
@@ -951,22 +1140,55 @@ def solicitudes_confeccion_list(request):
     elif fecha_hasta:
         solicitudes_qs = solicitudes_qs.filter(fecha_creacion__lte=timezone.make_aware(datetime.combine(fecha_hasta, dt_time.max)))
 
-    solicitudes = list(solicitudes_qs.order_by('-fecha_creacion'))
-    total_cotizaciones = solicitudes_qs.aggregate(total=Sum('cotizacion_monto'))['total'] or Decimal('0')
+    filtros = {
+        'estado': estado,
+        'fecha_desde': fecha_desde_raw,
+        'fecha_hasta': fecha_hasta_raw,
+        'solicitud_id': solicitud_id,
+    }
+    return solicitudes_qs, filtros
+
+
+@admin_required
+def solicitudes_confeccion_list(request):
+    """
+    Lista todas las solicitudes de confección para el panel de administración.
+    """
+    solicitudes_qs, filtros = _filtrar_solicitudes(request)
+
+    pagina = paginar_admin(
+        request, solicitudes_qs, ('-fecha_creacion', '-id'),
+        campos=('nombre', 'correo', 'tipo_prenda', 'estado', 'cotizacion_monto'),
+        agregados={'total': Sum('cotizacion_monto')},
+    )
+    solicitudes = pagina.items
+    total_cotizaciones = pagina.totales['total'] or Decimal('0')
 
     low_stock = _low_stock_context(request)
 
     return render(request, 'core/solicitudes_confeccion_list.html', {
         'solicitudes': solicitudes,
-        'estado': estado,
-        'fecha_desde': fecha_desde_raw,
-        'fecha_hasta': fecha_hasta_raw,
-        'solicitud_id': solicitud_id,
+        'pagina': pagina,
+        **filtros,
         'total_cotizaciones': total_cotizaciones,
         **low_stock,
     })
 
 
+@admin_required
+def solicitudes_confeccion_csv(request):
+    """
+    Exporta a CSV las solicitudes de confección que cumplen los filtros del listado.
+    """
+    solicitudes_qs, _ = _filtrar_solicitudes(request)
+    columnas = [
+        'id', 'fecha_creacion', 'nombre', 'correo', 'telefono', 'tipo_prenda', 'estado',
+        'cotizacion_monto', 'cotizacion_aceptada',
+    ]
+    filas = solicitudes_qs.order_by('-fecha_creacion', '-id').values_list(*columnas).iterator(chunk_size=EXPORT_CHUNK)
+    return csv_streaming(f'solicitudes_confeccion_{timezone.localdate():%Y%m%d}.csv', columnas, filas)
+
+
 @admin_required
 def historial_clientes(request):
     search = (request.GET.get('q') or '').strip()
@@ -980,7 +1202,7 @@ def historial_clientes(request):
         )
 
     if selected:
-        historial = HistorialCliente.objects.filter(nombre=selected).order_by('-fecha')
+        historial = HistorialCliente.objects.filter(cliente__username=selected).order_by('-fecha')
     else:
         historial = HistorialCliente.objects.none()
 
@@ -1151,6 +1373,7 @@ def actualizar_cantidad_carrito(request, id):
 
     carrito[key] = cantidad
     request.session['carrito'] = carrito
+    liberar_reservas(clave_reserva(request), id)
     messages.success(request, 'Cantidad actualizada.')
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.headers.get('accept', '').find('application/json') != -1:
@@ -1166,92 +1389,32 @@ def eliminar_del_carrito(request, id):
     if str(id) in carrito:
         del carrito[str(id)]
         request.session['carrito'] = carrito
+        liberar_reservas(clave_reserva(request), id)
     return redirect('ver_carrito')
 
 
 def ver_carrito(request):
-    carrito = request.session.get('carrito', {})
-    # normaliza cantidades previas que superen el máximo
-    changed = False
-    for pid, cantidad in list(carrito.items()):
-        try:
-            qty = int(cantidad)
-        except (TypeError, ValueError):
-            qty = 1
-        qty = max(1, min(qty, MAX_PRODUCT_QUANTITY))
-        if qty != cantidad:
-            carrito[pid] = qty
-            changed = True
-    if changed:
-        request.session['carrito'] = carrito
-
-    productos = []
-    total = Decimal(0)
-    faltantes = []
-    allow_checkout = True
-    total_limit_exceeded = False
-
-    for id, cantidad in carrito.items():
-        try:
-            producto = Producto.objects.get(id=id)
-        except Producto.DoesNotExist:
-            allow_checkout = False
-            faltantes.append({
-                'nombre': f'Producto #{id} no disponible',
-                'disponible': 0,
-                'cantidad': cantidad,
-            })
-            productos.append({
-                'id': id,
-                'nombre': 'Producto no disponible',
-                'precio': Decimal('0'),
-                'cantidad': cantidad,
-                'subtotal': Decimal('0'),
-                'imagen': '',
-                'stock_ok': False,
-                'stock': 0,
-                'activo': False,
-            })
-            continue
-
-        subtotal = producto.precio * cantidad
-        total += subtotal
-        stock_ok = producto.stock >= cantidad
-        activo_ok = producto.activo
-        if not stock_ok or not activo_ok:
-            allow_checkout = False
-            faltantes.append({
-                'nombre': producto.nombre,
-                'disponible': producto.stock,
-                'cantidad': cantidad,
-            })
-        productos.append({
-            'id': producto.id,
-            'nombre': producto.nombre,
-            'precio': producto.precio,
-            'cantidad': cantidad,
-            'subtotal': subtotal,
-            'imagen': producto.imagen.url if getattr(producto, 'imagen', None) else '',
-            'stock_ok': stock_ok,
-            'stock': producto.stock,
-            'activo': activo_ok,
-            'comprable': stock_ok and activo_ok,
-        })
-
-    if total > MAX_ORDER_TOTAL:
-        allow_checkout = False
-        total_limit_exceeded = True
+    carrito = normalizar_carrito(request)
+    cotizado = cotizar_carrito(carrito, clave_reserva(request))
 
     return render(request, 'core/carrito.html', {
-        'productos': productos,
-        'total': total,
+        'productos': cotizado.lineas,
+        'total': cotizado.total,
         'cart_count': _cart_count(request),
-        'allow_checkout': allow_checkout,
-        'faltantes': faltantes,
-        'total_limit_exceeded': total_limit_exceeded,
+        'allow_checkout': cotizado.allow_checkout,
+        'faltantes': cotizado.faltantes,
+        'total_limit_exceeded': cotizado.total_limit_exceeded,
     })
 
 
+def carrito_resumen(request):
+    """
+    Versión JSON del carrito (mismo cálculo que ver_carrito).
+    """
+    carrito = normalizar_carrito(request)
+    return JsonResponse({'ok': True, **cotizar_carrito(carrito, clave_reserva(request)).as_json()})
+
+
 @login_required
 @csrf_protect
 def confirmar_pedido(request):
@@ -1259,118 +1422,70 @@ def confirmar_pedido(request):
         messages.error(request, 'Tu cuenta está bloqueada. No puedes realizar pedidos.')
         return redirect('catalogo')
 
-    carrito = request.session.get('carrito', {})
-    changed = False
-    for pid, cantidad in list(carrito.items()):
-        try:
-            qty = int(cantidad)
-        except (TypeError, ValueError):
-            qty = 1
-        qty = max(1, min(qty, MAX_PRODUCT_QUANTITY))
-        if qty != cantidad:
-            carrito[pid] = qty
-            changed = True
-    if changed:
-        request.session['carrito'] = carrito
+    # Reenvío del mismo formulario (doble click / timeout): devuelve el pedido original
+    token = (request.POST.get('idempotency_key') or '').strip() if request.method == 'POST' else ''
+    pedido = pedido_por_token(request.user, token)
+    if pedido is not None:
+        request.session['carrito'] = {}
+        return render(request, 'core/pedido_confirmado.html', {'pedido': pedido})
+
+    carrito = normalizar_carrito(request)
 
     if not carrito:
         messages.error(request, 'Tu carrito está vacío.')
         return redirect('catalogo')
 
     # Prepara vista previa de productos en el carrito
-    productos_ctx = []
-    total_ctx = Decimal('0')
-    for pid, cantidad in carrito.items():
-        try:
-            prod = Producto.objects.get(id=pid)
-        except Producto.DoesNotExist:
-            messages.error(request, 'Hay productos no disponibles en tu carrito.')
-            return redirect('ver_carrito')
+    clave = clave_reserva(request)
+    cotizado = cotizar_carrito(carrito, clave)
+    if cotizado.inexistentes:
+        messages.error(request, 'Hay productos no disponibles en tu carrito.')
+        return redirect('ver_carrito')
+    if cotizado.deshabilitados:
+        prod = cotizado.deshabilitados[0]
+        messages.error(request, f'El producto "{prod.nombre}" esta deshabilitado y no puede comprarse.')
+        return redirect('ver_carrito')
 
-        if not prod.activo:
-            messages.error(request, f'El producto "{prod.nombre}" esta deshabilitado y no puede comprarse.')
-            return redirect('ver_carrito')
-        subtotal = prod.precio * cantidad
-        total_ctx += subtotal
-        productos_ctx.append({
-            'id': prod.id,
-            'nombre': prod.nombre,
-            'precio': prod.precio,
-            'cantidad': cantidad,
-            'subtotal': subtotal,
-            'imagen': prod.imagen.url if getattr(prod, 'imagen', None) else '',
-        })
-
-    if total_ctx > MAX_ORDER_TOTAL:
+    if cotizado.total_limit_exceeded:
         messages.error(request, f'El total del carrito supera el límite permitido (${MAX_ORDER_TOTAL}). Reduce la cantidad o quita productos.')
         return redirect('ver_carrito')
 
     if request.method == 'POST':
         try:
-            with transaction.atomic():
-                # Verificación previa de stock con bloqueo de fila
-                faltantes = []
-                productos_seleccionados = {}
-                for pid, cantidad in carrito.items():
-                    try:
-                        prod = Producto.objects.select_for_update().get(id=pid)
-                    except Producto.DoesNotExist:
-                        faltantes.append((f'Producto #{pid} no disponible', 0, cantidad))
-                        continue
-
-                    if not prod.activo:
-                        faltantes.append((f'{prod.nombre} (deshabilitado)', prod.stock, cantidad))
-                        continue
-
-                    if prod.stock < cantidad:
-                        faltantes.append((prod.nombre, prod.stock, cantidad))
-                    productos_seleccionados[pid] = prod
-
-                if faltantes:
-                    readable = '; '.join([f'{n} (disponible: {d}, solicitado: {c})' for n, d, c in faltantes])
-                    msg = 'No hay stock suficiente para: ' + readable
-                    messages.error(request, msg)
-                    return redirect('ver_carrito')
-
-                cliente = request.user
-                pedido = Pedido.objects.create(
-                    nombre_cliente=cliente.username,
-                    correo=cliente.email,
-                    direccion=cliente.direccion or 'Sin dirección',
-                    total=Decimal('0')
-                )
-
-                total = Decimal('0')
-                for pid, cantidad in carrito.items():
-                    prod = productos_seleccionados[pid]
-                    subtotal = prod.precio * cantidad
-                    total += subtotal
-                    if total > MAX_ORDER_TOTAL:
-                        messages.error(request, f'El total del carrito supera el límite permitido (${MAX_ORDER_TOTAL}). Reduce la cantidad o quita productos.')
-                        raise transaction.TransactionManagementError("total_limit_exceeded")
-                    DetallePedido.objects.create(pedido=pedido, producto=prod, cantidad=cantidad, subtotal=subtotal)
-                    prod.stock -= cantidad
-                    prod.save()
-
-                pedido.total = total
-                pedido.save()
-        except transaction.TransactionManagementError:
+            pedido = registrar_pedido(request.user, carrito, clave, token=token)
+        except PedidoDuplicado as exc:
+            request.session['carrito'] = {}
+            return render(request, 'core/pedido_confirmado.html', {'pedido': exc.pedido})
+        except StockInsuficiente as exc:
+            readable = '; '.join([f'{n} (disponible: {d}, solicitado: {c})' for n, d, c in exc.faltantes])
+            messages.error(request, 'No hay stock suficiente para: ' + readable)
+            return redirect('ver_carrito')
+        except TotalExcedido:
+            messages.error(request, f'El total del carrito supera el límite permitido (${MAX_ORDER_TOTAL}). Reduce la cantidad o quita productos.')
             return redirect('ver_carrito')
 
         request.session['carrito'] = {}
         messages.success(request, 'Pedido confirmado correctamente.')
         return render(request, 'core/pedido_confirmado.html', {'pedido': pedido})
 
+    # Al iniciar el checkout se aparta el stock por STOCK_HOLD_TTL segundos
+    faltantes = reservar_carrito(clave, {int(pid): cantidad for pid, cantidad in carrito.items()})
+    if faltantes:
+        readable = '; '.join([f'{n} (disponible: {d}, solicitado: {c})' for n, d, c in faltantes])
+        messages.error(request, 'No hay stock suficiente para: ' + readable)
+        return redirect('ver_carrito')
+
     return render(request, 'core/confirmar_pedido.html', {
-        'productos': productos_ctx,
-        'total': total_ctx,
+        'productos': cotizado.lineas,
+        'total': cotizado.total,
         'cart_count': _cart_count(request),
+        'idempotency_key': emitir_token(),
     })
 
 
 @login_required
 def mis_pedidos(request):
-    pedidos = Pedido.objects.filter(nombre_cliente=request.user.username).order_by('-fecha')
+    pedidos = Pedido.objects.filter(cliente=request.user).order_by('-fecha')
     for p in pedidos:
         p.boleta_url = _boleta_pedido(p)
 
@@ -1649,6 +1764,7 @@ def forgot_password_reset(request):
             user.set_password(p1)
             user.save()
             HistorialCliente.objects.create(
+                cliente=user,
                 nombre=user.username,
                 correo=user.email,
                 accion='password restablecida'